@@ -1,13 +1,39 @@
 from homeassistant.helpers import device_registry as dr
-from .const import DOMAIN
+from .const import (
+    API_URL,
+    CONF_API_URL,
+    CONF_MAX_IN_FLIGHT,
+    CONF_OPENMETRICS,
+    CONF_RATE_LIMIT,
+    CONF_REALTIME_URL,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_RATE_LIMIT,
+    DOMAIN,
+    REALTIME_URL,
+)
 
+from functools import partial
 import logging
 from homeassistant import config_entries
 from homeassistant.core import HomeAssistant
 from .setup import async_setup as setup_component
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from .api import IrsapApiClient
+from .auth import TokenManager
+from .coordinator import IrsapDataUpdateCoordinator
+from .device_manager import DeviceManager
+from .metrics import Metrics
+from .openmetrics import IrsapMetricsView
+from .scheduler import RequestScheduler
+from .subscription import ShadowSubscription
 
 _LOGGER = logging.getLogger(__name__)
 
+# La view HTTP non si può rimuovere: si registra una volta sola per istanza
+OPENMETRICS_VIEW = f"{DOMAIN}_openmetrics_view"
+# Il throttling di AppSync non distingue le entry: il budget è unico
+REQUEST_SCHEDULER = f"{DOMAIN}_request_scheduler"
+
 
 async def async_setup(hass: HomeAssistant, config: dict):
     return await setup_component(hass, config)
@@ -15,12 +41,67 @@ async def async_setup(hass: HomeAssistant, config: dict):
 
 async def async_setup_entry(hass, config_entry):
     """Imposta il custom component"""
+    if config_entry.unique_id == DOMAIN:
+        # Le entry create quando era ammesso un solo account usano il dominio
+        hass.config_entries.async_update_entry(
+            config_entry, unique_id=config_entry.data["username"].lower()
+        )
+    if "token" in config_entry.data:
+        # Il token di accesso scade in un'ora: le entry meno recenti lo salvavano
+        hass.config_entries.async_update_entry(
+            config_entry,
+            data={k: v for k, v in config_entry.data.items() if k != "token"},
+        )
+
+    # Misure delle chiamate al cloud, esposte nei diagnostici
+    metrics = Metrics()
+    token_manager = TokenManager(hass, config_entry, metrics)
+    config_entry.async_on_unload(token_manager.async_shutdown)
+    api_url = config_entry.data.get(CONF_API_URL) or API_URL
+    api = IrsapApiClient(
+        async_get_clientsession(hass), api_url, metrics, _async_get_scheduler(hass)
+    )
+    coordinator = IrsapDataUpdateCoordinator(hass, config_entry, api, token_manager)
+    config_entry.async_on_unload(coordinator.async_shutdown_commands)
+    # Prima lettura dello shadow, condivisa da tutte le entità
+    await coordinator.async_config_entry_first_refresh()
+
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][config_entry.entry_id] = {
-        "token": config_entry.data["token"],
-        "envID": config_entry.data["envID"],
+        "api": api,
+        "token_manager": token_manager,
+        "coordinator": coordinator,
+        "metrics": metrics,
+        "devices": DeviceManager(),
+        "options": dict(config_entry.options),
     }
 
+    if coordinator.realtime:
+        subscriptions = {}
+        for envID in coordinator.envIDs:
+            subscription = ShadowSubscription(
+                async_get_clientsession(hass),
+                token_manager,
+                envID,
+                partial(coordinator.async_apply_shadow_update, envID),
+                coordinator.async_subscription_connected,
+                url=config_entry.data.get(CONF_REALTIME_URL) or REALTIME_URL,
+                api_url=api_url,
+            )
+            config_entry.async_create_background_task(
+                hass, subscription.async_run(), f"{DOMAIN}_{envID}_subscription"
+            )
+            subscriptions[envID] = subscription
+        hass.data[DOMAIN][config_entry.entry_id]["subscriptions"] = subscriptions
+
+    if config_entry.options.get(CONF_OPENMETRICS) and not hass.data.get(
+        OPENMETRICS_VIEW
+    ):
+        hass.http.register_view(IrsapMetricsView())
+        hass.data[OPENMETRICS_VIEW] = True
+
+    config_entry.async_on_unload(config_entry.add_update_listener(async_update_options))
+
     # Carica prima 'climate' e poi 'sensor'
     await hass.config_entries.async_forward_entry_setups(config_entry, ["climate"])
     await hass.config_entries.async_forward_entry_setups(config_entry, ["sensor"])
@@ -28,13 +109,41 @@ async def async_setup_entry(hass, config_entry):
     return True
 
 
+def _async_get_scheduler(hass):
+    "Return the shared request scheduler with the strictest configured budget."
+    scheduler = hass.data.get(REQUEST_SCHEDULER)
+    if scheduler is None:
+        scheduler = hass.data[REQUEST_SCHEDULER] = RequestScheduler()
+
+    options = [entry.options for entry in hass.config_entries.async_entries(DOMAIN)]
+    scheduler.configure(
+        min(
+            (o.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT) for o in options),
+            default=DEFAULT_MAX_IN_FLIGHT,
+        ),
+        min(
+            (o.get(CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT) for o in options),
+            default=DEFAULT_RATE_LIMIT,
+        ),
+    )
+    return scheduler
+
+
+async def async_update_options(hass, config_entry):
+    """Ricarica l'integrazione quando cambiano le opzioni"""
+    # Il salvataggio del refresh token aggiorna l'entry senza toccare le opzioni
+    if config_entry.options != hass.data[DOMAIN][config_entry.entry_id]["options"]:
+        await hass.config_entries.async_reload(config_entry.entry_id)
+
+
 async def async_unload_entry(hass, config_entry):
     """Scarica le entità del custom component"""
     unload_ok = await hass.config_entries.async_unload_platforms(
         config_entry, ["climate", "sensor"]
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(config_entry.entry_id)
+        entry_data = hass.data[DOMAIN].pop(config_entry.entry_id)
+        entry_data["devices"].clear()
     return unload_ok
 
 
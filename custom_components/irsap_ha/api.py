@@ -0,0 +1,251 @@
+"""AppSync API client for the irsap_ha integration."""
+
+import asyncio
+from functools import partial
+import json
+import logging
+import time
+
+import aiohttp
+
+from .const import API_URL, SHADOW_FRESHNESS
+from .metrics import Metrics
+from .scheduler import PRIORITY_COMMAND, PRIORITY_POLL, QueueTimeout
+
+_LOGGER = logging.getLogger(__name__)
+
+LIST_ENVIRONMENTS_QUERY = "query ListEnvironments {\n listEnvironments {\n environments {\n envId\n envName\n userRole\n __typename\n }\n __typename\n }\n}\n"
+GET_SHADOW_QUERY = "query GetShadow($envId: ID!) {\n  getShadow(envId: $envId) {\n    envId\n    payload\n    __typename\n  }\n}\n"
+UPDATE_SHADOW_MUTATION = "mutation UpdateShadow($envId: ID!, $payload: AWSJSON!) {\n asyncUpdateShadow(envId: $envId, payload: $payload) {\n status\n code\n message\n payload\n __typename\n }\n}\n"
+
+
+class UnauthorizedError(Exception):
+    """Raised when AppSync rejects the access token."""
+
+
+def update_accepted(result):
+    "Return True if an asyncUpdateShadow result reports success."
+    if result is None:
+        return False
+    code = result.get("code")
+    if code is None:
+        return str(result.get("status", "")).upper() not in ("ERROR", "FAILED")
+    try:
+        return int(code) < 400
+    except (TypeError, ValueError):
+        return False
+
+
+def result_version(result, version):
+    "Return the shadow version after an accepted write."
+    try:
+        return int(json.loads(result["payload"])["version"])
+    except (KeyError, TypeError, ValueError):
+        # AWS IoT incrementa la versione ad ogni aggiornamento accettato
+        return version + 1 if isinstance(version, int) else None
+
+
+class IrsapApiClient:
+    """Send GraphQL operations to AppSync over a shared, long-lived session."""
+
+    def __init__(self, session, url=API_URL, metrics=None, scheduler=None):
+        # La sessione è gestita da Home Assistant: connessioni keep-alive e
+        # cache DNS restano valide tra una chiamata e l'altra
+        self._session = session
+        self._url = url
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.scheduler = scheduler
+        # (envID, operazione) -> lettura in corso, condivisa da chi la chiede
+        self._inflight = {}
+        # (envID, operazione) -> (istante, risultato) dell'ultima lettura riuscita
+        self._fresh = {}
+
+    def invalidate(self, envID):
+        "Forget the shadow reads of an environment, done or running, after it changed."
+        self._fresh.pop((envID, "GetShadow"), None)
+        self._inflight.pop((envID, "GetShadow"), None)
+
+    async def _async_single_flight(self, key, fetch):
+        "Run `fetch` once for concurrent callers and reuse a result just read."
+        fresh = self._fresh.get(key)
+        if fresh is not None and time.monotonic() - fresh[0] <= SHADOW_FRESHNESS:
+            self.metrics.cache(f"{key[1]}_shared", True)
+            return fresh[1]
+
+        task = self._inflight.get(key)
+        self.metrics.cache(f"{key[1]}_shared", task is not None)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(fetch())
+            task.add_done_callback(partial(self._fetched, key))
+        # Chi rinuncia all'attesa non annulla la lettura degli altri
+        return await asyncio.shield(task)
+
+    def _fetched(self, key, task):
+        if self._inflight.get(key) is not task:
+            return  # Invalidata durante la lettura: il risultato è già vecchio
+        del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        if task.result() is not None:
+            self._fresh[key] = (time.monotonic(), task.result())
+
+    async def async_graphql(
+        self,
+        token,
+        operation,
+        query,
+        variables=None,
+        priority=PRIORITY_POLL,
+        timeout=None,
+        queue_timeout=None,
+    ):
+        """Run a GraphQL operation and return the decoded `data` field.
+
+        `timeout` bounds the HTTP call; `queue_timeout` bounds the wait for a
+        slot of the scheduler, raising QueueTimeout.
+        """
+        envID = (variables or {}).get("envId")
+        if self.scheduler is None:
+            return await self._async_post(
+                token, operation, query, variables, envID, timeout
+            )
+
+        # Il budget di richieste è condiviso da tutte le entry e le case
+        queued_at = time.monotonic()
+        try:
+            async with self.scheduler.slot(envID, priority, queue_timeout):
+                self.metrics.record_wait(operation, time.monotonic() - queued_at)
+                return await self._async_post(
+                    token, operation, query, variables, envID, timeout
+                )
+        except QueueTimeout:
+            self.metrics.count(f"{operation}_queue_timeouts")
+            raise
+
+    async def _async_post(self, token, operation, query, variables, envID, timeout):
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        body = json.dumps(
+            {
+                "operationName": operation,
+                "variables": variables or {},
+                "query": query,
+            }
+        ).encode()
+
+        # Il timeout vale per la sola chiamata, non per l'attesa in coda
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        start = time.monotonic()
+        received = None
+        unauthorized = False
+        try:
+            async with self._session.post(
+                self._url, data=body, headers=headers, **kwargs
+            ) as response:
+                content = await response.read()
+                received = len(content)
+                # Solo un token rifiutato giustifica un nuovo login
+                unauthorized = response.status == 401
+                if response.status != 200:
+                    _LOGGER.error(
+                        f"API request error: {response.status} - "
+                        f"{content.decode(errors='replace')}"
+                    )
+                    data = None
+                else:
+                    data = json.loads(content).get("data")
+        except (aiohttp.ClientError, TimeoutError, ValueError) as e:
+            if isinstance(e, TimeoutError):
+                self.metrics.count(f"{operation}_timeouts")
+            _LOGGER.error(f"Error during API call {operation}: {e!r}")
+            data = None
+
+        self.metrics.record_call(
+            operation,
+            time.monotonic() - start,
+            data is not None,
+            sent=len(body),
+            received=received,
+            envID=envID,
+        )
+        if unauthorized:
+            raise UnauthorizedError(operation)
+        return data
+
+    async def async_list_environments(self, token):
+        "Return the environments visible to the account."
+        return await self._async_single_flight(
+            (None, "ListEnvironments"), partial(self._async_list_environments, token)
+        )
+
+    async def _async_list_environments(self, token):
+        try:
+            data = await self.async_graphql(
+                token, "ListEnvironments", LIST_ENVIRONMENTS_QUERY
+            )
+        except UnauthorizedError:
+            return None
+        if data is None:
+            return None
+        return (data.get("listEnvironments") or {}).get("environments", [])
+
+    async def async_get_shadow(
+        self,
+        token,
+        envID,
+        priority=PRIORITY_POLL,
+        timeout=None,
+        shared=True,
+        queue_timeout=None,
+    ):
+        """Return the decoded shadow document of an environment.
+
+        With `shared`, concurrent callers wait for the same read and a read
+        completed in the last SHADOW_FRESHNESS seconds is reused. Raise
+        UnauthorizedError when the access token is rejected.
+        """
+        fetch = partial(
+            self._async_get_shadow, token, envID, priority, timeout, queue_timeout
+        )
+        if not shared:
+            return await fetch()
+        return await self._async_single_flight((envID, "GetShadow"), fetch)
+
+    async def _async_get_shadow(self, token, envID, priority, timeout, queue_timeout):
+        data = await self.async_graphql(
+            token,
+            "GetShadow",
+            GET_SHADOW_QUERY,
+            {"envId": envID},
+            priority=priority,
+            timeout=timeout,
+            queue_timeout=queue_timeout,
+        )
+        if data is None:
+            return None
+        try:
+            return json.loads(data["getShadow"]["payload"])
+        except (KeyError, TypeError, ValueError) as e:
+            _LOGGER.error(f"Invalid shadow received for {envID}: {e}")
+            return None
+
+    async def async_update_shadow(self, token, envID, payload):
+        """Send an UpdateShadow mutation and return its result, or None on error.
+
+        Raise UnauthorizedError when the access token is rejected.
+        """
+        data = await self.async_graphql(
+            token,
+            "UpdateShadow",
+            UPDATE_SHADOW_MUTATION,
+            {"envId": envID, "payload": json.dumps(payload)},
+            priority=PRIORITY_COMMAND,
+        )
+        if data is None:
+            return None
+        return data.get("asyncUpdateShadow") or {}
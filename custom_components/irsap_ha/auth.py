@@ -0,0 +1,172 @@
+"""Cognito token lifecycle for the irsap_ha integration."""
+
+import asyncio
+import base64
+import json
+import logging
+import time
+
+import aiohttp
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_call_later
+
+from .circuit import CircuitBreaker
+from .cognito import CognitoClient, CognitoError
+from .const import (
+    CONF_COGNITO_URL,
+    CONF_PASSWORD,
+    CONF_REFRESH_TOKEN,
+    CONF_USERNAME,
+    TOKEN_RENEW_MARGIN,
+)
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_login_with_srp(session, username, password, endpoint=None):
+    "Log in with SRP and return the Cognito tokens."
+    try:
+        return await CognitoClient(session, endpoint).async_login(username, password)
+    except (CognitoError, aiohttp.ClientError, TimeoutError, KeyError, ValueError) as e:
+        _LOGGER.error(f"Error during login: {e}")
+        return None
+
+
+async def async_refresh_tokens(session, refresh_token, endpoint=None):
+    "Renew access and id tokens with the refresh-token flow."
+    try:
+        return await CognitoClient(session, endpoint).async_refresh(refresh_token)
+    except (CognitoError, aiohttp.ClientError, TimeoutError, KeyError, ValueError) as e:
+        _LOGGER.debug(f"Error during token refresh: {e}")
+        return None
+
+
+def token_expiry(token):
+    "Return the `exp` claim of a JWT, or 0 if it cannot be read."
+    try:
+        claims = token.split(".")[1]
+        claims += "=" * (-len(claims) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return 0
+
+
+class TokenManager:
+    """Cache the Cognito tokens of an account and renew them ahead of expiry."""
+
+    def __init__(self, hass, config_entry, metrics=None):
+        self.hass = hass
+        self.config_entry = config_entry
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.access_token = None
+        self.id_token = None
+        self.refresh_token = config_entry.data.get(CONF_REFRESH_TOKEN)
+        self.endpoint = config_entry.data.get(CONF_COGNITO_URL)
+        self.expires_at = 0
+        self._lock = asyncio.Lock()
+        self._unsub_renew = None
+        # Un login fallito basta: i tentativi successivi aspettano il backoff
+        self.breaker = CircuitBreaker("cognito", threshold=1, metrics=self.metrics)
+
+    @property
+    def is_valid(self):
+        "Return True if the cached access token is not about to expire."
+        return (
+            self.access_token is not None
+            and time.time() < self.expires_at - TOKEN_RENEW_MARGIN
+        )
+
+    def set_tokens(self, tokens):
+        "Store a token set and schedule its renewal."
+        self.access_token = tokens["access_token"]
+        self.id_token = tokens.get("id_token")
+        # Cognito emette access token validi un'ora
+        self.expires_at = token_expiry(self.access_token) or time.time() + 3600
+
+        if (
+            tokens.get("refresh_token")
+            and tokens["refresh_token"] != self.refresh_token
+        ):
+            self.refresh_token = tokens["refresh_token"]
+            # Salva il refresh token per evitare un nuovo SRP al riavvio
+            self.hass.config_entries.async_update_entry(
+                self.config_entry,
+                data={**self.config_entry.data, CONF_REFRESH_TOKEN: self.refresh_token},
+            )
+
+        self._schedule_renew()
+
+    async def async_get_access_token(self):
+        "Return a valid access token, renewing it if needed."
+        if self.is_valid:
+            return self.access_token
+
+        # Chi arriva durante un rinnovo attende lo stesso rinnovo
+        async with self._lock:
+            if not self.is_valid and self.breaker.allow():
+                await self._async_renew()
+        return self.access_token
+
+    async def async_invalidate(self):
+        "Drop the cached access token after the API rejected it."
+        self.access_token = None
+        self.expires_at = 0
+        return await self.async_get_access_token()
+
+    async def _async_renew(self):
+        session = async_get_clientsession(self.hass)
+        tokens = None
+        if self.refresh_token:
+            start = time.monotonic()
+            tokens = await async_refresh_tokens(
+                session, self.refresh_token, self.endpoint
+            )
+            self._record("TokenRefresh", start, tokens)
+            if tokens is None:
+                _LOGGER.debug("Refresh token rejected, falling back to SRP login")
+
+        if tokens is None:
+            start = time.monotonic()
+            tokens = await async_login_with_srp(
+                session,
+                self.config_entry.data[CONF_USERNAME],
+                self.config_entry.data[CONF_PASSWORD],
+                self.endpoint,
+            )
+            self._record("Login", start, tokens)
+
+        if tokens is None:
+            self.access_token = None
+            self.expires_at = 0
+            self.breaker.record_failure()
+            return
+
+        self.breaker.record_success()
+        self.set_tokens(tokens)
+
+    def _record(self, operation, start, tokens):
+        self.metrics.record_call(
+            operation, time.monotonic() - start, tokens is not None
+        )
+
+    def _schedule_renew(self):
+        if self._unsub_renew is not None:
+            self._unsub_renew()
+            self._unsub_renew = None
+        delay = max(self.expires_at - TOKEN_RENEW_MARGIN - time.time(), 0)
+        self._unsub_renew = async_call_later(
+            self.hass, delay, self._async_scheduled_renew
+        )
+
+    async def _async_scheduled_renew(self, _now):
+        "Renew the tokens in the background before they expire."
+        self._unsub_renew = None
+        async with self._lock:
+            await self._async_renew()
+
+    def async_shutdown(self):
+        "Cancel the scheduled renewal."
+        if self._unsub_renew is not None:
+            self._unsub_renew()
+            self._unsub_renew = None
@@ -0,0 +1,109 @@
+"""Circuit breaker for the IRSAP cloud calls."""
+
+import logging
+import random
+import time
+
+from .const import CIRCUIT_BASE_DELAY, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_MAX_DELAY
+
+_LOGGER = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def jittered(delay):
+    "Return a random delay between half and all of `delay`."
+    # Chi fallisce insieme non deve riprovare insieme
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    """Stop calling a failing service and probe it again after a growing backoff.
+
+    After `threshold` consecutive failures the circuit opens and every call is
+    refused until the backoff expires. Then a single probe is let through
+    (half-open): its success closes the circuit, its failure reopens it with
+    twice the backoff, up to `max_delay`.
+    """
+
+    def __init__(
+        self,
+        name,
+        threshold=CIRCUIT_FAILURE_THRESHOLD,
+        base_delay=CIRCUIT_BASE_DELAY,
+        max_delay=CIRCUIT_MAX_DELAY,
+        metrics=None,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0  # Aperture consecutive, per il backoff
+        self.retry_at = 0
+        self._probe_at = None
+
+    @property
+    def closed(self):
+        "Return True if calls go through normally."
+        return self.state == CLOSED
+
+    def allow(self):
+        "Return True if a call may be made now."
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self.retry_at:
+                return False
+            self.state = HALF_OPEN
+            _LOGGER.debug(f"Circuit {self.name} half-open, probing")
+        # Una sola sonda alla volta; una sonda persa non blocca il circuito
+        if self._probe_at is not None and now - self._probe_at < self.base_delay:
+            return False
+        self._probe_at = now
+        return True
+
+    def record_success(self):
+        "Close the circuit after a successful call."
+        if self.state != CLOSED:
+            _LOGGER.info(f"Circuit {self.name} closed, the service is back")
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._probe_at = None
+
+    def record_failure(self):
+        "Count a failed call, opening the circuit when needed."
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            self._open()
+
+    def _open(self):
+        delay = jittered(min(self.base_delay * 2**self.opened, self.max_delay))
+        self.opened += 1
+        self.state = OPEN
+        self.retry_at = time.monotonic() + delay
+        self._probe_at = None
+        if self.metrics is not None:
+            self.metrics.count("circuit_opened")
+        _LOGGER.warning(
+            f"Circuit {self.name} open after {self.failures} failures, "
+            f"next attempt in {delay:.0f}s"
+        )
+
+    def as_dict(self):
+        "Return the state of the circuit for the diagnostics."
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in_s": (
+                max(round(self.retry_at - time.monotonic()), 0)
+                if self.state == OPEN
+                else None
+            ),
+        }
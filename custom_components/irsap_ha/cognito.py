@@ -0,0 +1,210 @@
+"""Asyncio Cognito client for the irsap_ha integration.
+
+Implements the USER_SRP_AUTH and REFRESH_TOKEN_AUTH flows of the Cognito user
+pool API over an aiohttp session, following the AWS Amplify SRP helpers.
+"""
+
+import asyncio
+import base64
+from datetime import datetime, timezone
+import hashlib
+import hmac
+import logging
+import secrets
+
+import aiohttp
+
+from .const import CLIENT_ID, REGION, USER_POOL_ID
+
+_LOGGER = logging.getLogger(__name__)
+
+# Gruppo SRP a 3072 bit usato da Cognito (RFC 5054)
+N_HEX = (
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+    "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+    "83655D23DCA3AD961C62F356208552BB9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+    "15728E5A8AAAC42DAD33170D04507A33A85521ABDF1CBA64ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+    "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6BF12FFA06D98A0864D87602733EC86A64521F2B18177B200C"
+    "BBE117577A615D6C770988C0BAD946E208E24FA074E5AB3143DB5BFCE0FD108E4B82D120A93AD2CAFFFFFFFFFFFFFFFF"
+)
+N = int(N_HEX, 16)
+G = 2
+INFO_BITS = b"Caldera Derived Key\x01"
+
+REQUEST_TIMEOUT = 30  # Secondi
+
+
+def _hash_hex(data):
+    return hashlib.sha256(data).hexdigest().rjust(64, "0")
+
+
+def _pad_hex(value):
+    "Hex encode a number (or hex string) the way the SRP helpers hash it."
+    text = value if isinstance(value, str) else f"{value:x}"
+    if len(text) % 2 == 1:
+        return f"0{text}"
+    if text[0] in "89ABCDEFabcdef":
+        return f"00{text}"
+    return text
+
+
+K = int(_hash_hex(bytes.fromhex("00" + N_HEX + "02")), 16)
+
+
+def _hkdf(ikm, salt):
+    prk = hmac.new(salt, ikm, hashlib.sha256).digest()
+    return hmac.new(prk, INFO_BITS, hashlib.sha256).digest()[:16]
+
+
+def _generate_a():
+    "Return a random SRP secret `a` and the public value `A = g^a % N`."
+    small_a = secrets.randbits(1024) % N
+    big_a = pow(G, small_a, N)
+    if big_a % N == 0:
+        raise ValueError("Safety check for A failed")
+    return small_a, big_a
+
+
+def _password_key(pool_name, username, password, small_a, big_a, big_b, salt):
+    "Derive the HKDF key that signs the PASSWORD_VERIFIER challenge."
+    u = int(_hash_hex(bytes.fromhex(_pad_hex(big_a) + _pad_hex(big_b))), 16)
+    if u == 0:
+        raise ValueError("U cannot be zero")
+    secret = _hash_hex(f"{pool_name}{username}:{password}".encode())
+    x = int(_hash_hex(bytes.fromhex(_pad_hex(salt) + secret)), 16)
+    s = pow(big_b - K * pow(G, x, N), small_a + u * x, N)
+    return _hkdf(bytes.fromhex(_pad_hex(s)), bytes.fromhex(_pad_hex(f"{u:x}")))
+
+
+def _timestamp():
+    # Cognito vuole il giorno del mese senza zero iniziale
+    now = datetime.now(timezone.utc)
+    return f"{now:%a %b} {now.day} {now:%H:%M:%S} UTC {now.year}"
+
+
+def _tokens(result, refresh_token=None):
+    return {
+        "access_token": result["AccessToken"],
+        "id_token": result.get("IdToken"),
+        "refresh_token": result.get("RefreshToken", refresh_token),
+    }
+
+
+class CognitoError(Exception):
+    """Raised when Cognito rejects a request."""
+
+    def __init__(self, kind, message):
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+
+
+class CognitoClient:
+    """Log in to the IRSAP user pool on the event loop."""
+
+    def __init__(
+        self,
+        session,
+        endpoint=None,
+        pool_id=USER_POOL_ID,
+        client_id=CLIENT_ID,
+        region=REGION,
+    ):
+        self._session = session
+        self._endpoint = endpoint or f"https://cognito-idp.{region}.amazonaws.com/"
+        self._pool_name = pool_id.split("_", 1)[1]
+        self._client_id = client_id
+
+    async def _async_call(self, target, body):
+        headers = {
+            "Content-Type": "application/x-amz-json-1.1",
+            "X-Amz-Target": f"AWSCognitoIdentityProviderService.{target}",
+        }
+        async with self._session.post(
+            self._endpoint,
+            json=body,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        ) as response:
+            # Il content type x-amz-json non è application/json
+            data = await response.json(content_type=None)
+            if response.status != 200:
+                kind = str(data.get("__type", response.status)).rsplit("#", 1)[-1]
+                raise CognitoError(kind, data.get("message") or data.get("Message"))
+            return data
+
+    async def async_login(self, username, password):
+        "Run USER_SRP_AUTH and return the access, id and refresh tokens."
+        loop = asyncio.get_running_loop()
+        # Le potenze modulari a 3072 bit costano decine di millisecondi:
+        # si calcolano nell'executor per non bloccare il loop
+        small_a, big_a = await loop.run_in_executor(None, _generate_a)
+
+        response = await self._async_call(
+            "InitiateAuth",
+            {
+                "AuthFlow": "USER_SRP_AUTH",
+                "ClientId": self._client_id,
+                "AuthParameters": {"USERNAME": username, "SRP_A": f"{big_a:x}"},
+            },
+        )
+        if response.get("ChallengeName") != "PASSWORD_VERIFIER":
+            raise CognitoError(
+                "UnsupportedChallenge", str(response.get("ChallengeName"))
+            )
+
+        params = response["ChallengeParameters"]
+        user_id = params["USER_ID_FOR_SRP"]
+        key = await loop.run_in_executor(
+            None,
+            _password_key,
+            self._pool_name,
+            user_id,
+            password,
+            small_a,
+            big_a,
+            int(params["SRP_B"], 16),
+            params["SALT"],
+        )
+
+        timestamp = _timestamp()
+        secret_block = params["SECRET_BLOCK"]
+        message = (
+            self._pool_name.encode()
+            + user_id.encode()
+            + base64.b64decode(secret_block)
+            + timestamp.encode()
+        )
+        signature = base64.b64encode(hmac.new(key, message, hashlib.sha256).digest())
+
+        response = await self._async_call(
+            "RespondToAuthChallenge",
+            {
+                "ChallengeName": "PASSWORD_VERIFIER",
+                "ClientId": self._client_id,
+                "ChallengeResponses": {
+                    "TIMESTAMP": timestamp,
+                    "USERNAME": user_id,
+                    "PASSWORD_CLAIM_SECRET_BLOCK": secret_block,
+                    "PASSWORD_CLAIM_SIGNATURE": signature.decode(),
+                },
+            },
+        )
+        if "AuthenticationResult" not in response:
+            raise CognitoError(
+                "UnsupportedChallenge", str(response.get("ChallengeName"))
+            )
+        return _tokens(response["AuthenticationResult"])
+
+    async def async_refresh(self, refresh_token):
+        "Run REFRESH_TOKEN_AUTH and return new access and id tokens."
+        response = await self._async_call(
+            "InitiateAuth",
+            {
+                "AuthFlow": "REFRESH_TOKEN_AUTH",
+                "ClientId": self._client_id,
+                "AuthParameters": {"REFRESH_TOKEN": refresh_token},
+            },
+        )
+        return _tokens(response["AuthenticationResult"], refresh_token)
@@ -0,0 +1,244 @@
+"""Per-environment command pipeline for the irsap_ha integration."""
+
+import asyncio
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .api import UnauthorizedError, result_version, update_accepted
+from .const import COMMAND_DEBOUNCE, MAX_WRITE_ATTEMPTS
+from .payload import build_patch, enable_changes, setpoint_changes
+from .scheduler import PRIORITY_COMMAND
+from .shadow import resolve_keys
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _is_noop(desired, keys, temperature=None, enable=None):
+    "Return True if the desired state already holds the requested values."
+    if keys is None:
+        return True
+    if temperature is not None:
+        msp = desired.get(keys.msp) or {}
+        if msp.get("p", {}).get("v") != int(temperature * 10):
+            return False
+    if enable is not None and desired.get(keys.enb) != enable:
+        return False
+    return True
+
+
+class CommandQueue:
+    """Serialize, debounce and coalesce the writes to an environment shadow."""
+
+    def __init__(self, hass, coordinator, envID):
+        self.hass = hass
+        self.coordinator = coordinator
+        self.envID = envID
+        # device_name -> {"temperature": ..., "enable": ...}
+        self._pending = {}
+        self._waiters = []
+        self._lock = asyncio.Lock()
+        self._unsub_flush = None
+
+    async def async_set_temperature(self, device_name, temperature):
+        "Queue a new setpoint for a radiator."
+        return await self._async_enqueue(device_name, {"temperature": temperature})
+
+    async def async_set_enable(self, device_name, enable):
+        "Queue a new ENB value for a radiator."
+        return await self._async_enqueue(device_name, {"enable": enable})
+
+    async def _async_enqueue(self, device_name, changes):
+        # L'ultima modifica per lo stesso radiatore sostituisce le precedenti
+        pending = self._pending.setdefault(device_name, {})
+        pending.update(changes)
+
+        waiter = self.hass.loop.create_future()
+        self._waiters.append(waiter)
+        self._schedule_flush()
+        return await waiter
+
+    @callback
+    def _schedule_flush(self):
+        "Flush once the debounce window of the first pending command ends."
+        # La finestra non riparte ad ogni comando: un trascinamento continuo
+        # dello slider non rimanda la scrittura all'infinito
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(
+                self.hass, COMMAND_DEBOUNCE, self._async_scheduled_flush
+            )
+
+    async def _async_scheduled_flush(self, _now):
+        self._unsub_flush = None
+        await self._async_flush()
+
+    async def _async_flush(self):
+        "Write every pending change with a single UpdateShadow mutation."
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+
+            success = True
+            if pending:
+                try:
+                    success = await self._async_write(pending)
+                except Exception as e:
+                    _LOGGER.error(f"Error while sending queued commands: {e}")
+                    success = False
+
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(success)
+
+            # Comandi arrivati durante la scrittura: partono con il prossimo giro
+            if self._pending:
+                self._schedule_flush()
+
+    async def _async_write(self, pending):
+        token_manager = self.coordinator.token_manager
+        api = self.coordinator.api
+        metrics = self.coordinator.metrics
+        envID = self.envID
+        breaker = self.coordinator.get_breaker(envID)
+
+        token = await token_manager.async_get_access_token()
+        if not token:
+            _LOGGER.error("Unable to obtain the token. Check configuration.")
+            return False
+
+        # Si scrive sullo snapshot in cache: il GET serve solo dopo un rifiuto
+        # (senza E_SCH: la pianificazione è già riassunta in "scheduling")
+        payload = scheduling = None
+        if self.coordinator.data and envID in self.coordinator.data["environments"]:
+            environment = self.coordinator.data["environments"][envID]
+            payload, scheduling = environment["payload"], environment["scheduling"]
+        metrics.cache("snapshot", payload is not None)
+
+        # Un solo esito per scrittura, qualunque sia il numero di tentativi
+        answered = None
+        try:
+            for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+                if not breaker.allow():
+                    _LOGGER.warning(
+                        f"IRSAP cloud unavailable for {envID}, command not sent"
+                    )
+                    return False
+                if attempt > 1:
+                    metrics.count("UpdateShadow_retries")
+                try:
+                    if payload is None:
+                        # Dopo un conflitto serve lo shadow attuale, non uno condiviso
+                        payload = await api.async_get_shadow(
+                            token, envID, priority=PRIORITY_COMMAND, shared=False
+                        )
+                        if payload is None:
+                            answered = False
+                            _LOGGER.error(
+                                f"Failed to retrieve current payload for {envID}"
+                            )
+                            return False
+
+                    keys, desired_changes = self._build_changes(
+                        payload, pending, scheduling
+                    )
+                    if not desired_changes:
+                        _LOGGER.debug(
+                            "Queued commands already applied, skipping update"
+                        )
+                        return True
+
+                    patch = build_patch(payload, desired_changes)
+                    _LOGGER.debug(
+                        f"Sending {len(pending)} queued commands for {envID} "
+                        f"(version {patch['version']}, attempt {attempt})"
+                    )
+                    result = await api.async_update_shadow(token, envID, patch)
+                except UnauthorizedError:
+                    # Il cloud ha risposto: il token è stato revocato
+                    answered = True
+                    metrics.count("token_invalidations")
+                    token = await token_manager.async_invalidate()
+                    if not token:
+                        _LOGGER.error("Failed to regenerate token")
+                        return False
+                    continue
+
+                if result is None:
+                    # Errore di rete o del cloud: riprovare subito non aiuta
+                    answered = False
+                    _LOGGER.error(f"UpdateShadow failed for {envID}")
+                    return False
+                # Il cloud ha risposto: un conflitto di versione non è un guasto
+                answered = True
+                if update_accepted(result):
+                    self.coordinator.async_command_sent(
+                        envID, (k.prefix for k in keys.values() if k is not None)
+                    )
+                    self.coordinator.async_apply_changes(
+                        envID,
+                        payload,
+                        desired_changes,
+                        result_version(result, patch["version"]),
+                    )
+                    return True
+
+                _LOGGER.debug(f"UpdateShadow rejected for {envID}: {result}")
+                # Rilegge lo shadow e riapplica solo le nostre modifiche
+                payload = scheduling = None
+
+            return False
+        finally:
+            if answered is True:
+                breaker.record_success()
+            elif answered is False:
+                breaker.record_failure()
+
+    def _build_changes(self, payload, pending, scheduling=None):
+        "Return the keys of each radiator and the desired keys to write."
+        desired = payload.get("state", {}).get("desired", {})
+
+        # Le chiavi in cache valgono finché il _NAM corrisponde
+        keys = {}
+        for device_name in pending:
+            cached = self.coordinator.get_keys(self.envID, device_name)
+            keys[device_name] = resolve_keys(desired, device_name, cached)
+            self.coordinator.metrics.cache(
+                "keys", cached is not None and keys[device_name] is cached
+            )
+
+        # Solo le chiavi modificate: E_SCH e il resto dello shadow non viaggiano
+        desired_changes = {}
+        for device_name, change in pending.items():
+            radiator_keys = keys[device_name]
+            if _is_noop(desired, radiator_keys, **change):
+                continue
+            if change.get("temperature") is not None:
+                desired_changes.update(
+                    setpoint_changes(
+                        desired,
+                        device_name,
+                        change["temperature"],
+                        radiator_keys,
+                        scheduling,
+                    )
+                )
+            if change.get("enable") is not None:
+                desired_changes.update(
+                    enable_changes(
+                        desired, device_name, change["enable"], keys=radiator_keys
+                    )
+                )
+        return keys, desired_changes
+
+    @callback
+    def async_shutdown(self):
+        "Cancel the pending flush and fail the commands still waiting for it."
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        self._pending = {}
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(False)
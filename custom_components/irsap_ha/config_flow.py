@@ -1,13 +1,32 @@
 import logging
-import aiohttp
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import callback
 from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.data_entry_flow import FlowResult
 import voluptuous as vol
-from .const import DOMAIN, USER_POOL_ID, CLIENT_ID, REGION
-from warrant import Cognito
-import asyncio
+from .api import IrsapApiClient
+from .auth import async_login_with_srp
+from .const import (
+    DOMAIN,
+    API_URL,
+    CONF_API_URL,
+    CONF_BASE_INTERVAL,
+    CONF_COGNITO_URL,
+    CONF_MAX_IN_FLIGHT,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_OPENMETRICS,
+    CONF_RATE_LIMIT,
+    CONF_REALTIME,
+    CONF_REALTIME_URL,
+    CONF_REFRESH_TOKEN,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_RATE_LIMIT,
+    DEFAULT_SCAN_INTERVAL,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,60 +36,71 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    def _user_schema(self):
+        "Return the login form, with the endpoint overrides in advanced mode."
+        schema = {
+            vol.Required("username"): str,
+            vol.Required("password"): str,
+        }
+        if self.show_advanced_options:
+            # Endpoint alternativi, ad esempio tools/fake_appsync.py
+            schema.update(
+                {
+                    vol.Optional(CONF_API_URL): str,
+                    vol.Optional(CONF_REALTIME_URL): str,
+                    vol.Optional(CONF_COGNITO_URL): str,
+                }
+            )
+        return vol.Schema(schema)
+
     async def async_step_user(self, user_input=None) -> FlowResult:
         "Handle the initial step."
 
-        # Controlla se esiste già un'istanza dell'integrazione
-        await self.async_set_unique_id(DOMAIN)
-        existing_entry = self._async_current_entries()
-
-        if existing_entry:
-            # Se esiste già un'istanza, abortisci il flusso con un messaggio personalizzato
-            return self.async_abort(reason="Only one istance is allowed")
-
         if user_input is None:
             return self.async_show_form(
                 step_id="user",
-                data_schema=vol.Schema(
-                    {
-                        vol.Required("username"): str,
-                        vol.Required("password"): str,
-                    }
-                ),
+                data_schema=self._user_schema(),
             )
 
         # Estrazione delle credenziali dall'input dell'utente
         username = user_input["username"]
         password = user_input["password"]
 
-        # Call the function directly since login_with_srp already handles executor wrapping
-        token = await login_with_srp(self.hass, username, password)
+        # Un'istanza per ciascun account
+        await self.async_set_unique_id(username.lower())
+        self._abort_if_unique_id_configured()
+
+        endpoints = {
+            key: user_input[key]
+            for key in (CONF_API_URL, CONF_REALTIME_URL, CONF_COGNITO_URL)
+            if user_input.get(key)
+        }
+
+        tokens = await async_login_with_srp(
+            async_get_clientsession(self.hass),
+            username,
+            password,
+            endpoints.get(CONF_COGNITO_URL),
+        )
 
-        if token is None:
+        if tokens is None:
             _LOGGER.error("Login failed, invalid credentials.")
             return self.async_show_form(
                 step_id="user",
-                data_schema=vol.Schema(
-                    {
-                        vol.Required("username"): str,
-                        vol.Required("password"): str,
-                    }
-                ),
+                data_schema=self._user_schema(),
                 errors={"base": "invalid_credentials"},
             )
 
-        envID = await self.async_get_envID(username, password, token)
+        token = tokens["access_token"]
+        envIDs = await self.async_get_envIDs(
+            token, endpoints.get(CONF_API_URL, API_URL)
+        )
 
-        if envID is None:
+        if not envIDs:
             _LOGGER.error("Failed to obtain envID.")
             return self.async_show_form(
                 step_id="user",
-                data_schema=vol.Schema(
-                    {
-                        vol.Required("username"): str,
-                        vol.Required("password"): str,
-                    }
-                ),
+                data_schema=self._user_schema(),
                 errors={"base": "envid_failed"},
             )
 
@@ -80,8 +110,10 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             data={
                 "username": username,
                 "password": password,
-                "token": token,
-                "envID": envID,
+                CONF_REFRESH_TOKEN: tokens["refresh_token"],
+                "envID": envIDs[0],
+                "envIDs": envIDs,
+                **endpoints,
             },
         )
 
@@ -90,9 +122,9 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     def async_get_options_flow(config_entry):
         return RadiatorsIntegrationOptionsFlow(config_entry)
 
-    async def async_get_envID(self, username, password, token):
-        """Asynchronous method to get envID."""
-        return await envid_with_srp(username, password, token)
+    async def async_get_envIDs(self, token, url=API_URL):
+        """Asynchronous method to get the envID of every environment."""
+        return await async_list_envIDs(self.hass, token, url)
 
 
 class RadiatorsIntegrationOptionsFlow(config_entries.OptionsFlow):
@@ -117,6 +149,44 @@ class RadiatorsIntegrationOptionsFlow(config_entries.OptionsFlow):
                 vol.Required(
                     "password", default=self.config_entry.data.get("password")
                 ): str,
+                vol.Optional(
+                    CONF_REALTIME,
+                    default=self.config_entry.options.get(CONF_REALTIME, False),
+                ): bool,
+                vol.Optional(
+                    CONF_MIN_INTERVAL,
+                    default=self.config_entry.options.get(
+                        CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=5)),
+                vol.Optional(
+                    CONF_BASE_INTERVAL,
+                    default=self.config_entry.options.get(
+                        CONF_BASE_INTERVAL, DEFAULT_SCAN_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=5)),
+                vol.Optional(
+                    CONF_MAX_INTERVAL,
+                    default=self.config_entry.options.get(
+                        CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=5)),
+                vol.Optional(
+                    CONF_MAX_IN_FLIGHT,
+                    default=self.config_entry.options.get(
+                        CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT
+                    ),
+                ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Optional(
+                    CONF_RATE_LIMIT,
+                    default=self.config_entry.options.get(
+                        CONF_RATE_LIMIT, DEFAULT_RATE_LIMIT
+                    ),
+                ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+                vol.Optional(
+                    CONF_OPENMETRICS,
+                    default=self.config_entry.options.get(CONF_OPENMETRICS, False),
+                ): bool,
             }
         )
 
@@ -140,64 +210,17 @@ class RadiatorsIntegrationOptionsFlow(config_entries.OptionsFlow):
         return self.async_create_entry(title="", data=user_input)
 
 
-async def login_with_srp(hass, username, password):
-    "Log in and obtain the access token using Warrant."
-    return await hass.async_add_executor_job(_sync_login_with_srp, username, password)
-
-
-def _sync_login_with_srp(username, password):
-    """Synchronous function to log in using Warrant."""
-    try:
-        u = Cognito(USER_POOL_ID, CLIENT_ID, username=username, user_pool_region=REGION)
-        u.authenticate(password=password)
-        _LOGGER.debug(f"Access Token: {u.access_token}")
-        return u.access_token
-    except Exception as e:
-        _LOGGER.error(f"Error during login: {e}")
-        return None
-
-
-async def envid_with_srp(username, password, token):
-    """Login and obtain the envID using Warrant."""
-    async with aiohttp.ClientSession() as session:
-        url = "https://flqpp5xzjzacpfpgkloiiuqizq.appsync-api.eu-west-1.amazonaws.com/graphql"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
-        graphql_query = {
-            "operationName": "ListEnvironments",
-            "variables": {},
-            "query": "query ListEnvironments {\n listEnvironments {\n environments {\n envId\n envName\n userRole\n __typename\n }\n __typename\n }\n}\n",
-        }
-
-        try:
-            async with session.post(
-                url, headers=headers, json=graphql_query
-            ) as response:
-                if response.status != 200:
-                    error_msg = await response.text()
-                    _LOGGER.error(f"API request error: {response.status} - {error_msg}")
-                    return None
-
-                data = await response.json()
-                environments = (
-                    data.get("data", {})
-                    .get("listEnvironments", {})
-                    .get("environments", [])
-                )
-                if not environments:
-                    _LOGGER.error("No environments found in the API response")
-                    return None
-
-                envId = environments[0].get("envId")
-                if envId:
-                    _LOGGER.debug(f"envId retrieved from API: {envId}")
-                    return envId
-                else:
-                    _LOGGER.error("envId missing in the API response")
-                    return None
-
-        except Exception as e:
-            _LOGGER.error(f"Error during API call: {e}")
-            return None
+async def async_list_envIDs(hass, token, url=API_URL):
+    """Obtain the envID of every environment of the account."""
+    api = IrsapApiClient(async_get_clientsession(hass), url)
+    environments = await api.async_list_environments(token)
+    if not environments:
+        _LOGGER.error("No environments found in the API response")
+        return []
+
+    envIds = [e["envId"] for e in environments if e.get("envId")]
+    if envIds:
+        _LOGGER.debug(f"envIds retrieved from API: {envIds}")
+    else:
+        _LOGGER.error("envId missing in the API response")
+    return envIds
@@ -5,6 +5,17 @@ DOMAIN = "irsap_ha"
 # Config Entry Keys
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+CONF_REFRESH_TOKEN = "refresh_token"
+CONF_REALTIME = "realtime"
+CONF_MIN_INTERVAL = "min_interval"
+CONF_BASE_INTERVAL = "base_interval"
+CONF_MAX_INTERVAL = "max_interval"
+CONF_OPENMETRICS = "openmetrics"
+CONF_MAX_IN_FLIGHT = "max_in_flight"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_API_URL = "api_url"
+CONF_REALTIME_URL = "realtime_url"
+CONF_COGNITO_URL = "cognito_url"
 
 # Default values
 DEFAULT_NAME = "Radiator"
@@ -13,3 +24,38 @@ DEFAULT_NAME = "Radiator"
 USER_POOL_ID = "eu-west-1_qU4ok6EGG"
 CLIENT_ID = "4eg8veup8n831ebokk4ii5uasf"
 REGION = "eu-west-1"
+
+# API
+API_URL = (
+    "https://flqpp5xzjzacpfpgkloiiuqizq.appsync-api.eu-west-1.amazonaws.com/graphql"
+)
+REALTIME_URL = "wss://flqpp5xzjzacpfpgkloiiuqizq.appsync-realtime-api.eu-west-1.amazonaws.com/graphql"
+
+# Polling
+DEFAULT_SCAN_INTERVAL = 60  # Secondi tra due letture dello shadow
+DEFAULT_MIN_INTERVAL = 15  # Dopo un comando, fino alla conferma
+DEFAULT_MAX_INTERVAL = 900  # Quando lo shadow non cambia
+REALTIME_RECONCILE_INTERVAL = 900  # Con gli aggiornamenti push basta una verifica lenta
+ENVIRONMENT_FETCH_TIMEOUT = 20  # Una casa lenta non blocca le altre
+ENVIRONMENT_QUEUE_ALLOWANCE = 10  # Oltre questa attesa in coda il polling salta un giro
+ENVIRONMENTS_REFRESH_INTERVAL = 6 * 3600  # Verifica delle nuove case dell'account
+SHADOW_FRESHNESS = 2  # Secondi in cui una lettura appena conclusa viene riusata
+
+# Endpoint OpenMetrics per Prometheus, servito dalla cache
+OPENMETRICS_URL = "/api/irsap_ha/metrics"
+
+# Circuit breaker: dopo i fallimenti consecutivi si smette di chiamare il cloud
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_BASE_DELAY = 30  # Secondi, raddoppiati ad ogni nuova apertura
+CIRCUIT_MAX_DELAY = 900
+
+# Budget di richieste AppSync condiviso da tutte le entry
+DEFAULT_MAX_IN_FLIGHT = 4  # Richieste contemporanee
+DEFAULT_RATE_LIMIT = 5.0  # Richieste al secondo
+
+# Rinnovo del token prima della scadenza
+TOKEN_RENEW_MARGIN = 300  # Secondi
+
+# Comandi: attesa per raggruppare modifiche ravvicinate in una sola scrittura
+COMMAND_DEBOUNCE = 1.0  # Secondi
+MAX_WRITE_ATTEMPTS = 3  # Tentativi in caso di conflitto di versione
@@ -0,0 +1,319 @@
+"""Shared data coordinator for the irsap_ha integration."""
+
+import asyncio
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .api import UnauthorizedError
+from .circuit import CircuitBreaker
+from .commands import CommandQueue
+from .const import (
+    CONF_BASE_INTERVAL,
+    CONF_MAX_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_REALTIME,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_SCAN_INTERVAL,
+    DOMAIN,
+    ENVIRONMENTS_REFRESH_INTERVAL,
+    ENVIRONMENT_FETCH_TIMEOUT,
+    ENVIRONMENT_QUEUE_ALLOWANCE,
+    REALTIME_RECONCILE_INTERVAL,
+)
+from .polling import AdaptivePolling
+from .scheduler import QueueTimeout
+from .shadow import build_key_map, parse_shadow
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _is_older(payload, cached):
+    "Return True if `payload` has a lower shadow version than `cached`."
+    version, current = payload.get("version"), cached.get("version")
+    return isinstance(version, int) and isinstance(current, int) and version < current
+
+
+class IrsapDataUpdateCoordinator(DataUpdateCoordinator):
+    """Download and parse the shadow of every environment once per interval."""
+
+    def __init__(self, hass, config_entry, api, token_manager):
+        self.config_entry = config_entry
+        self.envIDs = list(
+            config_entry.data.get("envIDs") or [config_entry.data["envID"]]
+        )
+        self.api = api
+        self.token_manager = token_manager
+        self.metrics = api.metrics
+        options = config_entry.options
+        self.realtime = options.get(CONF_REALTIME, False)
+        self.polling = AdaptivePolling(
+            options.get(CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL),
+            options.get(CONF_BASE_INTERVAL, DEFAULT_SCAN_INTERVAL),
+            options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL),
+        )
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{config_entry.entry_id}",
+            # Con gli aggiornamenti push il polling serve solo da riconciliazione
+            update_interval=(
+                timedelta(seconds=REALTIME_RECONCILE_INTERVAL)
+                if self.realtime
+                else self.polling.interval
+            ),
+        )
+        self.commands = {}
+        self.breakers = {}
+        # envID -> nome della casa nell'app IRSAP NOW
+        self.env_names = {}
+        self._environments_checked_at = None
+
+    def get_commands(self, envID):
+        "Return the command queue of an environment."
+        if envID not in self.commands:
+            self.commands[envID] = CommandQueue(self.hass, self, envID)
+        return self.commands[envID]
+
+    def get_breaker(self, envID):
+        "Return the circuit breaker guarding the cloud calls of an environment."
+        if envID not in self.breakers:
+            self.breakers[envID] = CircuitBreaker(envID, metrics=self.metrics)
+        return self.breakers[envID]
+
+    @callback
+    def async_shutdown_commands(self):
+        "Cancel the pending flushes of every command queue."
+        for commands in self.commands.values():
+            commands.async_shutdown()
+
+    async def _async_update_data(self):
+        "Fetch every shadow concurrently and fan them out as per-serial records."
+        token = await self.token_manager.async_get_access_token()
+        if not token:
+            if self.data is not None and not self.token_manager.breaker.closed:
+                # Cognito non risponde: le entità mostrano l'ultimo stato noto
+                _LOGGER.debug("Login circuit open, keeping the last known state")
+                return self.data
+            raise UpdateFailed("Unable to obtain the token. Check configuration.")
+
+        if (
+            self._environments_checked_at is None
+            or time.monotonic() - self._environments_checked_at
+            > ENVIRONMENTS_REFRESH_INTERVAL
+        ):
+            await self._async_refresh_environments(token)
+
+        payloads, unauthorized = await self._async_fetch_shadows(token, self.envIDs)
+        if unauthorized:
+            # Token revocato: rinnova e riprova le sole case che l'hanno rifiutato
+            self.metrics.count("token_invalidations")
+            token = await self.token_manager.async_invalidate()
+            if token:
+                self.metrics.count("GetShadow_retries")
+                retried, _ = await self._async_fetch_shadows(token, unauthorized)
+                payloads.update(retried)
+
+        # Un solo esito per casa e per aggiornamento, dopo l'eventuale nuovo tentativo
+        for envID, payload in payloads.items():
+            if payload is None:
+                self.get_breaker(envID).record_failure()
+            else:
+                self.get_breaker(envID).record_success()
+
+        # Una casa lenta, in errore o a circuito aperto mantiene l'ultimo stato noto
+        previous = self.data["environments"] if self.data else {}
+        environments = {}
+        for envID in self.envIDs:
+            payload = payloads.get(envID)
+            if payload is not None and envID in previous:
+                if _is_older(payload, previous[envID]["payload"]):
+                    # Letto prima di una modifica già applicata alla cache
+                    _LOGGER.debug(f"Discarding an outdated shadow for {envID}")
+                    payload = None
+            if payload is not None:
+                _LOGGER.debug(f"Payload retrieved from API for {envID}: {payload}")
+                self.metrics.note_sync(envID)
+                environments[envID] = self._build_environment(envID, payload)
+            elif envID in previous:
+                environments[envID] = previous[envID]
+
+        if not environments:
+            raise UpdateFailed(f"Failed to retrieve the shadow for {self.envIDs}")
+
+        data = self._build_data(environments)
+        radiators = {
+            (envID, prefix): radiator
+            for envID, environment in environments.items()
+            for prefix, radiator in environment["devices"].items()
+        }
+        self.metrics.observe(radiators)
+        if not self.realtime:
+            self.update_interval = self.polling.observe(radiators)
+            _LOGGER.debug(f"Next poll in {self.update_interval}")
+        return data
+
+    async def _async_refresh_environments(self, token):
+        "Revalidate the environments of the account, reloading on new ones."
+        environments = await self.api.async_list_environments(token)
+        if environments is None:
+            return
+        self._environments_checked_at = time.monotonic()
+
+        envIDs = [e["envId"] for e in environments if e.get("envId")]
+        if not envIDs:
+            return
+        self.env_names = {
+            e["envId"]: e.get("envName") for e in environments if e.get("envId")
+        }
+        if self.data is not None and set(envIDs) - set(self.envIDs):
+            # Nuove case: ricarica l'entry per creare le relative entità
+            _LOGGER.debug(f"New environments found: {set(envIDs) - set(self.envIDs)}")
+            self.hass.config_entries.async_schedule_reload(self.config_entry.entry_id)
+        self.envIDs = envIDs
+
+    async def _async_fetch_shadows(self, token, envIDs):
+        """Fetch the shadows whose circuit is closed, with None for the failed ones.
+
+        Homes whose read found no free slot in time are left out, as a skipped
+        poll. Also return the homes that rejected the access token.
+        """
+        envIDs = [envID for envID in envIDs if self.get_breaker(envID).allow()]
+        results = await asyncio.gather(
+            *(
+                self.api.async_get_shadow(
+                    token,
+                    envID,
+                    timeout=ENVIRONMENT_FETCH_TIMEOUT,
+                    queue_timeout=ENVIRONMENT_QUEUE_ALLOWANCE,
+                )
+                for envID in envIDs
+            ),
+            return_exceptions=True,
+        )
+        payloads = {}
+        unauthorized = []
+        for envID, result in zip(envIDs, results):
+            if isinstance(result, QueueTimeout):
+                # Coda piena di comandi: non è un guasto del cloud
+                _LOGGER.debug(f"Shadow fetch for {envID} skipped, request queue busy")
+                continue
+            if isinstance(result, UnauthorizedError):
+                unauthorized.append(envID)
+            if isinstance(result, BaseException):
+                _LOGGER.debug(f"Shadow fetch failed for {envID}: {result!r}")
+                result = None
+            payloads[envID] = result
+        return payloads, unauthorized
+
+    @callback
+    def async_command_sent(self, envID, prefixes):
+        "Poll fast until the radiators confirm a command."
+        keys = [(envID, prefix) for prefix in prefixes]
+        self.metrics.note_command(keys)
+        self.polling.note_command(keys)
+        if not self.realtime:
+            self.update_interval = self.polling.interval
+
+    @callback
+    def async_apply_changes(self, envID, payload, changes, version):
+        "Merge an accepted patch into the snapshot it was built on and notify the entities."
+        # Una lettura precedente alla modifica non va più riusata
+        self.api.invalidate(envID)
+        state = payload.get("state", {})
+        desired = {**state.get("desired", {}), **changes}
+        payload = {
+            **payload,
+            "version": version,
+            "state": {**state, "desired": desired},
+        }
+        # Le pianificazioni sono già state tolte dallo snapshot in cache
+        previous = self.data["environments"].get(envID, {})
+        environment = self._build_environment(
+            envID, payload, previous.get("schedule_count")
+        )
+        self.metrics.note_sync(envID)
+        self.metrics.observe(
+            {
+                (envID, prefix): radiator
+                for prefix, radiator in environment["devices"].items()
+            }
+        )
+        environments = {**self.data["environments"], envID: environment}
+        self.async_set_updated_data(self._build_data(environments))
+
+    @callback
+    def async_apply_shadow_update(self, envID, document):
+        "Merge a shadow document pushed by the subscription into the snapshot."
+        if self.data is None or envID not in self.data["environments"]:
+            return
+
+        payload = self.data["environments"][envID]["payload"]
+        version = document.get("version")
+        current = payload.get("version")
+        if isinstance(version, int) and isinstance(current, int) and version <= current:
+            return  # Aggiornamento già applicato
+
+        changes = (document.get("state") or {}).get("desired")
+        if not changes:
+            return
+        self.async_apply_changes(
+            envID, payload, changes, version if version is not None else current
+        )
+
+    @callback
+    def async_subscription_connected(self):
+        "Catch up on updates missed while the subscription was down."
+        self.hass.async_create_task(self.async_request_refresh())
+
+    def get_keys(self, envID, serial):
+        "Return the cached shadow keys of a radiator, or None."
+        if self.data is None or envID not in self.data["environments"]:
+            return None
+        return self.data["environments"][envID]["keys"].get(serial)
+
+    def _build_environment(self, envID, payload, schedule_count=None):
+        state = payload.get("state", {})
+        desired = state.get("desired", {})
+        if "E_SCH" in desired:
+            # Delle pianificazioni serve solo il numero: non restano in memoria
+            schedule_count = len(desired["E_SCH"] or ())
+            desired = {key: value for key, value in desired.items() if key != "E_SCH"}
+            payload = {**payload, "state": {**state, "desired": desired}}
+        schedule_count = schedule_count or 0
+
+        devices = parse_shadow(desired, envID)
+
+        # La mappa seriale -> chiavi cambia solo se cambiano i radiatori
+        keys = None
+        if self.data is not None and envID in self.data["environments"]:
+            keys = self.data["environments"][envID]["keys"]
+            topology = {radiator.serial: prefix for prefix, radiator in devices.items()}
+            if {serial: k.prefix for serial, k in keys.items()} != topology:
+                keys = None
+            self.metrics.cache("key_map", keys is not None)
+        if keys is None:
+            keys = build_key_map(devices)
+
+        return {
+            "payload": payload,
+            "devices": devices,
+            "keys": keys,
+            "schedule_count": schedule_count,
+            # Una pianificazione per ogni _NAM, radiatori più l'eventuale E_NAM
+            "scheduling": schedule_count == len(devices) + ("E_NAM" in desired),
+        }
+
+    def _build_data(self, environments):
+        return {
+            "environments": environments,
+            "radiators": {
+                radiator.serial: radiator
+                for environment in environments.values()
+                for radiator in environment["devices"].values()
+            },
+        }
@@ -1,5 +1,15 @@
+from .const import DOMAIN
+
+
 class RadiatorDevice:
-    def __init__(self, radiator, token, envID):
+    def __init__(self, radiator, envID):
         self.radiator = radiator
-        self.token = token
         self.envID = envID
+        # Calcolato una volta e condiviso da tutte le entità del radiatore
+        self.device_info = {
+            "identifiers": {(DOMAIN, radiator.serial)},
+            "name": radiator.serial,
+            "model": radiator.model or "Unknown Model",
+            "manufacturer": "IRSAP",
+            "sw_version": radiator.firmware or "Unknown Firmware",
+        }
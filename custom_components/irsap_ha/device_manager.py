@@ -4,16 +4,48 @@ _LOGGER = logging.getLogger(__name__)
 
 
 class DeviceManager:
+    """Radiators of a config entry, indexed by serial and by shadow prefix."""
+
     def __init__(self):
-        self.devices = []
+        self._by_serial = {}
+        # (envID, prefisso) -> dispositivo: i prefissi sono unici per casa
+        self._by_prefix = {}
 
     def add_device(self, device):
-        self.devices.append(device)
-        _LOGGER.debug(f"Device added: {device.radiator['serial']}")
+        "Add a device, replacing any device with the same serial."
+        serial = device.radiator.serial
+        if serial in self._by_serial:
+            self.remove_device(serial)
+        self._by_serial[serial] = device
+        self._by_prefix[(device.envID, device.radiator.prefix)] = device
+        _LOGGER.debug(f"Device added: {serial}")
+
+    def replace_device(self, device):
+        "Replace the device with the same serial."
+        self.add_device(device)
+
+    def remove_device(self, serial):
+        "Remove a device and return it, or None if unknown."
+        device = self._by_serial.pop(serial, None)
+        if device is not None:
+            key = (device.envID, device.radiator.prefix)
+            if self._by_prefix.get(key) is device:
+                del self._by_prefix[key]
+            _LOGGER.debug(f"Device removed: {serial}")
+        return device
+
+    def get_device(self, serial):
+        return self._by_serial.get(serial)
+
+    def get_device_by_prefix(self, envID, prefix):
+        return self._by_prefix.get((envID, prefix))
 
     def get_devices(self):
-        return self.devices
+        return list(self._by_serial.values())
 
+    def clear(self):
+        self._by_serial.clear()
+        self._by_prefix.clear()
 
-# Singleton
-device_manager = DeviceManager()
+    def __len__(self):
+        return len(self._by_serial)
@@ -0,0 +1,65 @@
+"""Diagnostics support for the irsap_ha integration."""
+
+from homeassistant.components.diagnostics import async_redact_data
+
+from .const import CONF_PASSWORD, CONF_REFRESH_TOKEN, CONF_USERNAME, DOMAIN
+
+TO_REDACT = {
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    CONF_REFRESH_TOKEN,
+    "envID",
+    "envIDs",
+}
+
+
+async def async_get_config_entry_diagnostics(hass, config_entry):
+    "Return the diagnostics of a config entry, without credentials or IDs."
+    entry_data = hass.data[DOMAIN][config_entry.entry_id]
+    coordinator = entry_data["coordinator"]
+    token_manager = entry_data["token_manager"]
+    subscriptions = entry_data.get("subscriptions", {})
+
+    # Le case sono numerate: l'envID identifica l'account
+    environments = []
+    if coordinator.data is not None:
+        for envID, environment in coordinator.data["environments"].items():
+            environments.append(
+                {
+                    "version": environment["payload"].get("version"),
+                    "radiators": len(environment["devices"]),
+                    "scheduling": environment["scheduling"],
+                    "circuit": coordinator.get_breaker(envID).as_dict(),
+                    "subscription_connected": (
+                        subscriptions[envID].connected
+                        if envID in subscriptions
+                        else None
+                    ),
+                }
+            )
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(config_entry.data), TO_REDACT),
+            # Il flusso delle opzioni salva anche le credenziali
+            "options": async_redact_data(dict(config_entry.options), TO_REDACT),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval_s": (
+                coordinator.update_interval.total_seconds()
+                if coordinator.update_interval
+                else None
+            ),
+            "realtime": coordinator.realtime,
+            "quiet_polls": coordinator.polling.quiet_polls,
+            "cloud_cadence_s": coordinator.polling.cadence,
+        },
+        "token": {
+            "valid": token_manager.is_valid,
+            "circuit": token_manager.breaker.as_dict(),
+        },
+        "environments": environments,
+        "metrics": entry_data["metrics"].as_dict(),
+        "scheduler": entry_data["api"].scheduler.as_dict(),
+    }
@@ -0,0 +1,167 @@
+"""Lightweight runtime metrics for the irsap_ha integration."""
+
+from bisect import bisect_left
+from collections import defaultdict, deque
+import time
+
+from .polling import parse_lup
+
+# Campioni conservati per ogni misura: bastano per i percentili dei diagnostici
+MAX_SAMPLES = 200
+# Oltre questo tempo un comando non confermato non viene più atteso
+CONFIRMATION_TIMEOUT = 600  # Secondi
+# Finestra mobile dei sensori di salute
+HEALTH_WINDOW = 3600  # Secondi
+# Limiti superiori (secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _expire(samples, now):
+    "Drop the samples older than the health window, oldest first."
+    while samples and now - samples[0][0] > HEALTH_WINDOW:
+        samples.popleft()
+    return samples
+
+
+def _summary(samples, scale=1):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "p50": round(_percentile(values, 0.5) * scale, 1),
+        "p95": round(_percentile(values, 0.95) * scale, 1),
+        "p99": round(_percentile(values, 0.99) * scale, 1),
+        "max": round(values[-1] * scale, 1),
+    }
+
+
+class Metrics:
+    """Count the cloud calls of a config entry and keep their recent latencies."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = defaultdict(int)
+        self._latency = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        self._sizes = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+        # nome -> [successi, mancati]
+        self._cache = defaultdict(lambda: [0, 0])
+        # (envID, prefisso) -> istante del comando in attesa di conferma
+        self._unconfirmed = {}
+        # envID -> [(istante, operazione, durata, esito)] dell'ultima ora
+        self._recent = defaultdict(deque)
+        self._logins = deque()  # [(istante, esito)] dell'ultima ora
+        # envID -> istante dell'ultimo shadow ricevuto
+        self.synced_at = {}
+        # operazione -> [conteggi per bucket (l'ultimo è +Inf), somma]
+        self.histograms = {}
+
+    def record_call(self, operation, seconds, ok, sent=None, received=None, envID=None):
+        "Record the outcome, duration and body sizes of a cloud call."
+        self.counters[f"{operation}_calls"] += 1
+        if not ok:
+            self.counters[f"{operation}_errors"] += 1
+        self._latency[operation].append(seconds)
+        if sent is not None:
+            self._sizes[f"{operation}_request"].append(sent)
+        if received is not None:
+            self._sizes[f"{operation}_response"].append(received)
+
+        histogram = self.histograms.get(operation)
+        if histogram is None:
+            histogram = self.histograms[operation] = [
+                [0] * (len(LATENCY_BUCKETS) + 1),
+                0.0,
+            ]
+        histogram[0][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+
+        now = time.time()
+        if operation == "Login":
+            self._logins.append((now, ok))
+            _expire(self._logins, now)
+        if envID is not None:
+            recent = self._recent[envID]
+            recent.append((now, operation, seconds, ok))
+            _expire(recent, now)
+
+    def record_wait(self, operation, seconds):
+        "Record the time a call waited for the shared request budget."
+        self._latency[f"{operation}_queue"].append(seconds)
+
+    def note_sync(self, envID):
+        "Record that a fresh shadow of an environment was received."
+        self.synced_at[envID] = time.time()
+
+    def count(self, name):
+        "Increment a counter, e.g. a retry."
+        self.counters[name] += 1
+
+    def cache(self, name, hit):
+        "Record a hit or a miss of a cache."
+        self._cache[name][0 if hit else 1] += 1
+
+    def note_command(self, keys):
+        "Start timing the confirmation of the radiators that received a command."
+        now = time.time()
+        for key in keys:
+            self._unconfirmed[key] = now
+
+    def observe(self, devices):
+        "Time the commands confirmed by a new `_LUP` of their radiator."
+        now = time.time()
+        for key, sent_at in list(self._unconfirmed.items()):
+            radiator = devices.get(key)
+            lup = parse_lup(radiator.last_update) if radiator is not None else None
+            if lup is not None and lup >= sent_at:
+                del self._unconfirmed[key]
+                self._latency["command_confirmation"].append(now - sent_at)
+            elif now - sent_at > CONFIRMATION_TIMEOUT:
+                del self._unconfirmed[key]
+                self.counters["commands_unconfirmed"] += 1
+
+    def latency(self, envID, operation):
+        "Return the median latency in ms of an operation over the last hour."
+        recent = _expire(self._recent[envID], time.time())
+        values = sorted(seconds for _, op, seconds, _ in recent if op == operation)
+        if not values:
+            return None
+        return round(_percentile(values, 0.5) * 1000, 1)
+
+    def error_rate(self, envID):
+        "Return the percentage of failed calls to an environment over the last hour."
+        recent = _expire(self._recent[envID], time.time())
+        if not recent:
+            return None
+        return round(100 * sum(not ok for *_, ok in recent) / len(recent), 1)
+
+    def logins_per_hour(self):
+        "Return the number of SRP logins in the last hour."
+        return len(_expire(self._logins, time.time()))
+
+    def as_dict(self):
+        "Return the metrics as a JSON-serializable report."
+        return {
+            "uptime_s": round(time.time() - self.started_at),
+            "counters": dict(sorted(self.counters.items())),
+            "latency_ms": {
+                name: _summary(samples, 1000)
+                for name, samples in sorted(self._latency.items())
+            },
+            "size_bytes": {
+                name: _summary(samples) for name, samples in sorted(self._sizes.items())
+            },
+            "cache": {
+                name: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": round(hits / (hits + misses), 3),
+                }
+                for name, (hits, misses) in sorted(self._cache.items())
+            },
+            "pending_confirmations": len(self._unconfirmed),
+        }
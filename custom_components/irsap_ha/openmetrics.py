@@ -0,0 +1,119 @@
+"""OpenMetrics endpoint for the irsap_ha integration."""
+
+from itertools import accumulate
+
+from aiohttp import web
+from homeassistant.components.http import KEY_HASS, HomeAssistantView
+
+from .const import CONF_OPENMETRICS, DOMAIN, OPENMETRICS_URL
+from .metrics import LATENCY_BUCKETS
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# (nome, campo del Radiator, descrizione)
+RADIATOR_GAUGES = (
+    ("irsap_radiator_temperature_celsius", "temperature", "Room temperature (_TMP)."),
+    ("irsap_radiator_setpoint_celsius", "target_temperature", "Setpoint (_MSP)."),
+    ("irsap_radiator_wifi_signal_dbm", "wifi_signal", "WiFi signal (_SLV)."),
+    ("irsap_radiator_voc", "voc", "VOC level (_X_vocValue)."),
+    ("irsap_radiator_co2_ppm", "co2", "CO2 level (_X_co2Value)."),
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return (
+        "{"
+        + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        + "}"
+    )
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f"# TYPE {name} {kind}")
+    lines.append(f"# HELP {name} {help_text}")
+    lines.extend(samples)
+
+
+def render(entries):
+    "Render the metrics of the given entry data as OpenMetrics text."
+    lines = []
+    calls, errors, histograms = [], [], []
+    gauges = {name: [] for name, _, _ in RADIATOR_GAUGES}
+
+    for entry_id, entry_data in entries:
+        metrics = entry_data["metrics"]
+        for operation, (counts, total) in sorted(metrics.histograms.items()):
+            labels = {"entry": entry_id, "operation": operation}
+            calls.append(
+                "irsap_api_requests_total"
+                f"{_labels(**labels)} {metrics.counters.get(f'{operation}_calls', 0)}"
+            )
+            errors.append(
+                "irsap_api_errors_total"
+                f"{_labels(**labels)} {metrics.counters.get(f'{operation}_errors', 0)}"
+            )
+            cumulative = list(accumulate(counts))
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), cumulative):
+                histograms.append(
+                    "irsap_api_request_duration_seconds_bucket"
+                    f"{_labels(**labels, le=bound)} {count}"
+                )
+            histograms.append(
+                f"irsap_api_request_duration_seconds_count{_labels(**labels)} "
+                f"{cumulative[-1]}"
+            )
+            histograms.append(
+                f"irsap_api_request_duration_seconds_sum{_labels(**labels)} {total}"
+            )
+
+        data = entry_data["coordinator"].data
+        if data is None:
+            continue
+        for radiator in data["radiators"].values():
+            labels = _labels(env=radiator.envID, serial=radiator.serial)
+            for name, field, _ in RADIATOR_GAUGES:
+                value = getattr(radiator, field)
+                # Un valore assente non è uno zero: il campione si omette
+                if isinstance(value, (int, float)):
+                    gauges[name].append(f"{name}{labels} {value}")
+
+    _family(
+        lines, "irsap_api_requests", "counter", "Calls to AppSync and Cognito.", calls
+    )
+    _family(lines, "irsap_api_errors", "counter", "Failed calls.", errors)
+    _family(
+        lines,
+        "irsap_api_request_duration_seconds",
+        "histogram",
+        "Duration of the calls.",
+        histograms,
+    )
+    for name, _, help_text in RADIATOR_GAUGES:
+        _family(lines, name, "gauge", help_text, gauges[name])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+class IrsapMetricsView(HomeAssistantView):
+    """Serve the metrics of the entries with the OpenMetrics option enabled."""
+
+    url = OPENMETRICS_URL
+    name = "api:irsap_ha:metrics"
+    requires_auth = True
+
+    async def get(self, request):
+        "Render the in-memory snapshot: no call reaches the IRSAP cloud."
+        hass = request.app[KEY_HASS]
+        entries = [
+            (entry_id, entry_data)
+            for entry_id, entry_data in hass.data.get(DOMAIN, {}).items()
+            if entry_data["options"].get(CONF_OPENMETRICS)
+        ]
+        return web.Response(
+            body=render(entries).encode(),
+            headers={"Content-Type": CONTENT_TYPE},
+        )
@@ -0,0 +1,132 @@
+"""Shadow payload builders for the irsap_ha integration."""
+
+import time
+
+from .shadow import resolve_keys
+
+# Fake clientId: ci presentiamo come l'App su iOS
+APP_CLIENT_ID = "app-now2-1.9.38-2143-ios-bdd093f2-8e08-4541-8a7e-800c23274f21"
+
+
+def _with_value(setpoint, value):
+    "Return a copy of a setpoint structure such as `_MSP` with a new value."
+    return {**setpoint, "p": {**setpoint["p"], "v": value}}
+
+
+def has_scheduling(desired):
+    "Return True if `E_SCH` holds a schedule for each `_NAM` of the shadow."
+    num_radiatori = sum(1 for key in desired if key.endswith("_NAM"))
+    return len(desired.get("E_SCH", [])) == num_radiatori
+
+
+def setpoint_changes(desired, device_name, temperature, keys=None, scheduling=None):
+    "Return the desired keys to write for a new setpoint."
+    keys = resolve_keys(desired, device_name, keys)
+    if keys is None:
+        return {}
+
+    changes = {}
+    value = int(temperature * 10)
+
+    timestamp_24h_future = int(time.time()) + 24 * 3600
+    time_24h_future = time.strftime(
+        "%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(timestamp_24h_future)
+    )
+
+    # Controlla la pianificazione `E_SCH` per ciascun radiatore
+    if scheduling is None:
+        scheduling = has_scheduling(desired)
+
+    # Aggiorna _MSP
+    msp_key = keys.msp
+    if "p" in (desired.get(msp_key) or {}):
+        changes[msp_key] = _with_value(desired[msp_key], value)
+
+    tsp_key = keys.tsp
+    if tsp_key in desired:
+        changes[tsp_key] = {
+            "p": {
+                "u": 0,
+                "v": value,
+                "m": 3,
+                "k": "TEMPORARY",
+            },
+            "e": time_24h_future if scheduling else "1970-01-01T00:00:00.000Z",
+        }
+
+    # Imposta _MOD in base alla pianificazione
+    changes[keys.mod] = 2 if scheduling else 1
+
+    # Aggiorna _CSP
+    csp_key = keys.csp
+    if "p" in (desired.get(csp_key) or {}):
+        changes[csp_key] = _with_value(desired[csp_key], value)
+
+    # Aggiorna E_CLL e E_CPC se presenti, impostandoli a 1
+    for key in ("E_CLL", "E_CPC"):
+        if key in desired:
+            changes[key] = 1
+
+    return changes
+
+
+def enable_changes(desired, device_name, enable, call=False, keys=None):
+    "Return the desired keys to write to turn a radiator on (1) or off (0)."
+    keys = resolve_keys(desired, device_name, keys)
+    if keys is None:
+        return {}
+
+    changes = {}
+    enable_key = keys.enb
+    if enable_key in desired:
+        changes[enable_key] = 1 if enable == 1 else 0
+
+    # Aggiorna _CLL se presente, impostandolo a 1
+    cll_key = keys.cll
+    if call and cll_key in desired:
+        changes[cll_key] = 1
+
+    return changes
+
+
+def build_patch(payload, changes):
+    "Wrap the changed desired keys in the envelope expected by UpdateShadow."
+    return {
+        "id": payload.get("id"),
+        "clientId": APP_CLIENT_ID,
+        "timestamp": int(time.time() * 1000),  # Tempo attuale in millisecondi
+        "version": payload.get("version"),
+        "state": {"desired": changes},
+    }
+
+
+def _desired(payload):
+    return payload.get("state", {}).get("desired", {})
+
+
+def generate_device_payload(
+    payload, device_name, temperature=None, enable=None, keys=None
+):
+    "Build the patch that sets a new target temperature."
+    changes = {}
+    if temperature is not None:
+        changes = setpoint_changes(_desired(payload), device_name, temperature, keys)
+    return build_patch(payload, changes)
+
+
+def generate_state_payload(payload, device_name, enable, keys=None):
+    "Aggiorna il payload del dispositivo solo per lo stato di accensione/spegnimento."
+    return build_patch(
+        payload,
+        enable_changes(_desired(payload), device_name, enable, call=True, keys=keys),
+    )
+
+
+def generate_device_payload_for_hvac(
+    payload, device_name, hvac_mode=None, enable=None, keys=None
+):
+    "Build the patch that turns a radiator on (1) or off (0)."
+    changes = {}
+    if hvac_mode is not None:
+        changes = enable_changes(_desired(payload), device_name, hvac_mode, keys=keys)
+    return build_patch(payload, changes)
@@ -0,0 +1,97 @@
+"""Adaptive polling interval for the irsap_ha integration."""
+
+from datetime import datetime, timedelta
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Finestra di polling veloce dopo un comando non ancora confermato
+COMMAND_WINDOW = 120  # Secondi
+# Peso dell'ultimo intervallo osservato nella media della cadenza del cloud
+CADENCE_WEIGHT = 0.3
+
+
+def parse_lup(value):
+    "Return the timestamp of a `_LUP` value, or None if it cannot be read."
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class AdaptivePolling:
+    """Choose the next poll interval from recent commands and shadow activity."""
+
+    def __init__(self, min_interval, base_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.base_interval = min(max(base_interval, min_interval), self.max_interval)
+        self.cadence = None
+        self.quiet_polls = 0
+        # prefisso -> istante del comando in attesa di conferma
+        self._unconfirmed = {}
+        self._fingerprint = None
+
+    def note_command(self, prefixes):
+        "Poll fast until the radiators that received a command report back."
+        now = time.time()
+        for prefix in prefixes:
+            self._unconfirmed[prefix] = now
+
+    def observe(self, devices):
+        "Update the policy with a freshly parsed shadow and return the next interval."
+        now = time.time()
+
+        # Un comando è confermato quando il radiatore aggiorna il suo _LUP
+        for prefix, sent_at in list(self._unconfirmed.items()):
+            radiator = devices.get(prefix)
+            lup = parse_lup(radiator.last_update) if radiator is not None else None
+            if (lup is not None and lup >= sent_at) or now - sent_at > COMMAND_WINDOW:
+                del self._unconfirmed[prefix]
+
+        fingerprint = tuple(
+            (prefix, radiator.last_update, radiator.temperature)
+            for prefix, radiator in devices.items()
+        )
+        if fingerprint == self._fingerprint:
+            self.quiet_polls += 1
+        else:
+            self.quiet_polls = 0
+        self._fingerprint = fingerprint
+
+        # Impara la cadenza del cloud dallo scarto tra i _LUP di una stessa lettura:
+        # lo scarto tra due letture non scende mai sotto l'intervallo di polling
+        lups = sorted(
+            filter(None, (parse_lup(r.last_update) for r in devices.values()))
+        )
+        # I radiatori fermi da più del massimo non dicono nulla sulla cadenza
+        recent = [lup for lup in lups if lups[-1] - lup < self.max_interval]
+        spread = recent[-1] - recent[0] if len(recent) > 1 else 0
+        if spread > 0:
+            self.cadence = (
+                spread
+                if self.cadence is None
+                else (1 - CADENCE_WEIGHT) * self.cadence + CADENCE_WEIGHT * spread
+            )
+        elif self.cadence is not None:
+            # Senza nuovi campioni la stima torna verso l'intervallo base
+            self.cadence += CADENCE_WEIGHT * (self.base_interval - self.cadence)
+
+        return self.interval
+
+    @property
+    def interval(self):
+        "Return the interval to wait before the next poll."
+        if self._unconfirmed:
+            seconds = self.min_interval
+        else:
+            seconds = self.base_interval
+            if self.cadence is not None:
+                # Inutile interrogare il cloud più spesso di quanto si aggiorni
+                seconds = max(seconds, self.cadence)
+            # Rallenta quando lo shadow non cambia più
+            seconds *= 2 ** min(self.quiet_polls, 10)
+
+        seconds = min(max(seconds, self.min_interval), self.max_interval)
+        return timedelta(seconds=seconds)
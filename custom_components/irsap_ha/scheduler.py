@@ -0,0 +1,127 @@
+"""Shared request scheduler for the AppSync calls of the irsap_ha integration."""
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import time
+
+from .const import DEFAULT_MAX_IN_FLIGHT, DEFAULT_RATE_LIMIT
+
+# Priorità in ordine di servizio: i comandi dell'utente prima dei polling
+PRIORITY_COMMAND = 0
+PRIORITY_POLL = 1
+
+
+class QueueTimeout(Exception):
+    """Raised when a request waits too long for a slot of the budget."""
+
+
+class RequestScheduler:
+    """Share an in-flight cap and a rate budget between every entry and home.
+
+    Waiting requests are served by priority, then round-robin between the
+    homes, so a burst of commands to one home does not starve the others.
+    """
+
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT, rate=DEFAULT_RATE_LIMIT):
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.in_flight = 0
+        self._tokens = self._burst
+        self._refilled_at = time.monotonic()
+        # priorità -> envID -> futures in attesa, nell'ordine di turno
+        self._queues = (OrderedDict(), OrderedDict())
+        self._timer = None
+
+    @property
+    def _burst(self):
+        return max(self.rate, 1)
+
+    @property
+    def queued(self):
+        "Return the number of requests waiting for a slot."
+        return sum(len(w) for queue in self._queues for w in queue.values())
+
+    def configure(self, max_in_flight, rate):
+        "Apply new limits; waiting requests are re-evaluated at once."
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self._tokens = min(self._tokens, self._burst)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, envID, priority=PRIORITY_POLL, timeout=None):
+        """Wait for a slot in the budget and hold it for the duration of a call.
+
+        Raise QueueTimeout if no slot is free within `timeout` seconds.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(envID, deque()).append(future)
+        self._dispatch()
+        try:
+            async with asyncio.timeout(timeout):
+                await future
+        except (asyncio.CancelledError, TimeoutError) as e:
+            if future.done() and not future.cancelled():
+                self._release()  # Lo slot era già stato assegnato
+            if isinstance(e, TimeoutError):
+                raise QueueTimeout(envID) from e
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._tokens + (now - self._refilled_at) * self.rate, self._burst
+        )
+        self._refilled_at = now
+
+    def _next_waiter(self):
+        "Pop the next waiting future, by priority and then round-robin by home."
+        for queue in self._queues:
+            while queue:
+                envID, waiters = next(iter(queue.items()))
+                future = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(envID)
+                else:
+                    del queue[envID]
+                if not future.done():  # Le attese annullate si scartano
+                    return future
+        return None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self.in_flight < self.max_in_flight and self.queued:
+            self._refill()
+            if self._tokens < 1:
+                # Budget esaurito: si riprova quando si ricarica un gettone
+                self._timer = asyncio.get_running_loop().call_later(
+                    (1 - self._tokens) / self.rate, self._dispatch
+                )
+                return
+            future = self._next_waiter()
+            if future is None:
+                return
+            self._tokens -= 1
+            self.in_flight += 1
+            future.set_result(None)
+
+    def as_dict(self):
+        "Return the state of the scheduler for the diagnostics."
+        return {
+            "max_in_flight": self.max_in_flight,
+            "rate_per_s": self.rate,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+        }
@@ -0,0 +1,183 @@
+"""Shadow parser for the irsap_ha integration."""
+
+from dataclasses import dataclass
+
+# Prefisso delle chiavi che descrivono l'ambiente e non un radiatore
+ENV_PREFIX = "E"
+
+
+def _setpoint(value):
+    "Return the value of a setpoint structure such as `_MSP`."
+    return value["p"]["v"]
+
+
+# (suffisso, campo, tipo, scala): il valore convertito viene diviso per la scala
+DEVICE_FIELDS = (
+    ("_NAM", "serial", None, None),
+    ("_SRL", "mac", None, None),
+    ("_CNT", "connection", None, None),
+    ("_FWV", "firmware", None, None),
+    ("_TYP", "model", None, None),
+    ("_SLV", "wifi_signal", None, None),
+    ("_LUP", "last_update", None, None),
+    ("_TMP", "temperature", float, 10),
+    ("_MSP", "target_temperature", _setpoint, 10),
+    ("_ENB", "enable", None, None),
+    ("_X_ipAddress", "ip_address", None, None),
+    ("_X_filPiloteEnabled", "pilote_enable", None, None),
+    ("_X_filPiloteStatus", "pilote_status", None, None),
+    ("_X_standby", "standby", None, None),
+    ("_X_OpenWindowSensorEnabled", "open_window_enabled", None, None),
+    ("_X_OpenWindowDetected", "openwindow_detected", None, None),
+    ("_X_OpenWindowSensorOffTime", "openwindow_offset", None, None),
+    ("_X_temperatureSensorOffset", "temperature_offset", None, None),
+    ("_X_hysteresis", "hysteresis", None, None),
+    ("_X_vocValue", "voc", None, None),
+    ("_X_co2Value", "co2", None, None),
+    ("_X_lock", "lock", None, None),
+)
+
+_FIELDS_BY_SUFFIX = {suffix: spec for suffix, *spec in DEVICE_FIELDS}
+
+
+def split_key(key):
+    "Split a shadow key into (prefix, suffix) using the field table."
+    i = key.find("_")
+    while i != -1:
+        if key[i:] in _FIELDS_BY_SUFFIX:
+            return key[:i], key[i:]
+        i = key.find("_", i + 1)
+    return None, None
+
+
+def _convert(value, kind, scale):
+    if value is None or kind is None:
+        return value
+    try:
+        value = kind(value)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if scale is not None and value is not None:
+        value = value / scale
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class Radiator:
+    """State of a radiator parsed from the shadow, with values already scaled."""
+
+    prefix: str
+    serial: str
+    envID: str | None = None
+    mac: str | None = None
+    connection: int | None = None
+    firmware: str | None = None
+    model: str | None = None
+    wifi_signal: int | None = None
+    last_update: str | None = None
+    temperature: float | None = None  # None se lo shadow non ha _TMP
+    target_temperature: float | None = None
+    enable: int | None = None
+    ip_address: str | None = None
+    pilote_enable: int | None = None
+    pilote_status: int | None = None
+    standby: int | None = None
+    open_window_enabled: int | None = None
+    openwindow_detected: int | None = None
+    openwindow_offset: int | None = None
+    temperature_offset: int | None = None
+    hysteresis: int | None = None
+    voc: int | None = None
+    co2: int | None = None
+    lock: int | None = None
+
+    @property
+    def state(self):
+        return "HEAT" if self.enable == 1 else "OFF"
+
+
+def parse_shadow(desired, envID=None):
+    "Group the desired state into a `prefix -> Radiator` index in a single pass."
+    index = {}
+    for key, value in desired.items():
+        prefix, suffix = split_key(key)
+        if prefix is None or prefix == ENV_PREFIX:
+            continue
+
+        field, kind, scale = _FIELDS_BY_SUFFIX[suffix]
+        record = index.get(prefix)
+        if record is None:
+            record = index[prefix] = {}
+        record[field] = _convert(value, kind, scale)
+
+    # Solo i prefissi con un _NAM sono radiatori
+    devices = {}
+    for prefix, record in index.items():
+        if "serial" not in record:
+            continue
+        devices[prefix] = Radiator(prefix=prefix, envID=envID, **record)
+    return devices
+
+
+def extract_device_info(desired):
+    "Return the radiators of the desired state as a list."
+    return list(parse_shadow(desired).values())
+
+
+def find_device_key_by_name(desired, device_name, nam_suffix="_NAM"):
+    "Trova la chiave del dispositivo in base al nome."
+    for key, value in desired.items():
+        if key.endswith(nam_suffix) and value == device_name:
+            # Restituisce il prefisso del dispositivo (es. 'PCM', 'PTO')
+            return key[: -len(nam_suffix)]
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class RadiatorKeys:
+    """Shadow keys of a radiator, resolved once from its prefix."""
+
+    prefix: str
+    nam: str
+    tmp: str
+    msp: str
+    tsp: str
+    csp: str
+    enb: str
+    mod: str
+    cll: str
+
+    @classmethod
+    def for_prefix(cls, prefix):
+        return cls(
+            prefix,
+            *(
+                f"{prefix}{suffix}"
+                for suffix in (
+                    "_NAM",
+                    "_TMP",
+                    "_MSP",
+                    "_TSP",
+                    "_CSP",
+                    "_ENB",
+                    "_MOD",
+                    "_CLL",
+                )
+            ),
+        )
+
+
+def build_key_map(devices):
+    "Return `serial -> RadiatorKeys` for the radiators returned by `parse_shadow`."
+    return {
+        radiator.serial: RadiatorKeys.for_prefix(prefix)
+        for prefix, radiator in devices.items()
+    }
+
+
+def resolve_keys(desired, device_name, keys=None):
+    "Return the keys of a radiator, trusting `keys` only if they still match."
+    if keys is not None and desired.get(keys.nam) == device_name:
+        return keys
+    prefix = find_device_key_by_name(desired, device_name)
+    return None if prefix is None else RadiatorKeys.for_prefix(prefix)
@@ -0,0 +1,138 @@
+"""AppSync real-time shadow subscription for the irsap_ha integration."""
+
+import asyncio
+import base64
+import json
+import logging
+from urllib.parse import urlparse
+import uuid
+
+import aiohttp
+
+from .circuit import jittered
+from .const import API_URL, REALTIME_URL
+
+_LOGGER = logging.getLogger(__name__)
+
+SHADOW_SUBSCRIPTION = "subscription OnUpdateShadow($envId: ID!) {\n onUpdateShadow(envId: $envId) {\n envId\n payload\n __typename\n }\n}\n"
+
+# Attesa massima per il connection_ack
+ACK_TIMEOUT = 15
+# Attesa tra due tentativi di riconnessione
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 300
+
+
+class SubscriptionError(Exception):
+    """Raised when the AppSync real-time connection is refused or dropped."""
+
+
+class ShadowSubscription:
+    """Receive the shadow updates of an environment over the AppSync websocket."""
+
+    def __init__(
+        self,
+        session,
+        token_manager,
+        envID,
+        on_update,
+        on_connect=None,
+        url=REALTIME_URL,
+        api_url=API_URL,
+    ):
+        self._session = session
+        self._token_manager = token_manager
+        self._envID = envID
+        self._on_update = on_update
+        self._on_connect = on_connect
+        self._url = url
+        self._host = urlparse(api_url).netloc
+        self.connected = False
+
+    async def async_run(self):
+        "Keep the subscription open, reconnecting with backoff when it drops."
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self._async_listen()
+                delay = RECONNECT_MIN_DELAY
+            except (
+                aiohttp.ClientError,
+                TimeoutError,
+                TypeError,
+                ValueError,
+                SubscriptionError,
+            ) as e:
+                _LOGGER.debug(f"Shadow subscription for {self._envID} dropped: {e}")
+            finally:
+                self.connected = False
+
+            await asyncio.sleep(jittered(delay))
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _async_listen(self):
+        token = await self._token_manager.async_get_access_token()
+        if not token:
+            raise SubscriptionError("Unable to obtain the token")
+
+        auth = {"host": self._host, "Authorization": token}
+        header = base64.b64encode(json.dumps(auth).encode()).decode()
+        url = f"{self._url}?header={header}&payload=e30="
+
+        async with self._session.ws_connect(url, protocols=("graphql-ws",)) as ws:
+            await ws.send_json({"type": "connection_init"})
+            message = await ws.receive_json(timeout=ACK_TIMEOUT)
+            if message.get("type") != "connection_ack":
+                raise SubscriptionError(f"Connection refused: {message}")
+
+            # AppSync invia un "ka" entro questo intervallo finché la connessione è viva
+            keepalive = message.get("payload", {}).get("connectionTimeoutMs", 300000)
+
+            await ws.send_json(
+                {
+                    "id": str(uuid.uuid4()),
+                    "type": "start",
+                    "payload": {
+                        "data": json.dumps(
+                            {
+                                "query": SHADOW_SUBSCRIPTION,
+                                "variables": {"envId": self._envID},
+                            }
+                        ),
+                        "extensions": {"authorization": auth},
+                    },
+                }
+            )
+
+            while True:
+                msg = await ws.receive(timeout=keepalive / 1000)
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    raise SubscriptionError(f"Connection closed: {msg.type}")
+
+                message = json.loads(msg.data)
+                kind = message.get("type")
+                if kind == "ka":
+                    continue
+                if kind == "start_ack":
+                    _LOGGER.debug(f"Subscribed to shadow updates for {self._envID}")
+                    self.connected = True
+                    if self._on_connect is not None:
+                        self._on_connect()
+                elif kind == "data":
+                    self._handle_data(message.get("payload", {}))
+                elif kind == "complete":
+                    return
+                elif kind in ("error", "connection_error"):
+                    raise SubscriptionError(f"Subscription error: {message}")
+
+    def _handle_data(self, payload):
+        data = payload.get("data") or {}
+        for update in data.values():
+            if not update or not update.get("payload"):
+                continue
+            try:
+                document = json.loads(update["payload"])
+            except (TypeError, ValueError):
+                _LOGGER.debug(f"Invalid shadow update received: {update}")
+                continue
+            self._on_update(document)
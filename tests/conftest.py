@@ -0,0 +1,50 @@
+"""Shared fixtures of the irsap_ha tests."""
+
+import asyncio
+import importlib.util
+import os
+import sys
+import types
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tools"))
+
+if importlib.util.find_spec("homeassistant") is None:
+    # Senza Home Assistant bastano i due helper usati dalla coda dei comandi
+    def _async_call_later(hass, delay, action):
+        handle = asyncio.get_running_loop().call_later(
+            delay, lambda: asyncio.ensure_future(action(None))
+        )
+        return handle.cancel
+
+    for name, attributes in (
+        ("homeassistant", {}),
+        ("homeassistant.core", {"callback": lambda func: func}),
+        ("homeassistant.helpers", {}),
+        ("homeassistant.helpers.event", {"async_call_later": _async_call_later}),
+    ):
+        module = types.ModuleType(name)
+        module.__dict__.update(attributes)
+        sys.modules[name] = module
+
+
+@pytest.fixture
+def serve():
+    "Return a runner of `scenario(session, make_url)` against an aiohttp app."
+
+    def run(app, scenario):
+        async def main():
+            server = TestServer(app)
+            await server.start_server()
+            try:
+                async with aiohttp.ClientSession() as session:
+                    return await scenario(session, server.make_url)
+            finally:
+                await server.close()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,72 @@
+"""State machine and backoff of the circuit breaker."""
+
+import time
+
+from synthetic import load_module
+
+circuit = load_module("circuit")
+
+
+def make_breaker():
+    return circuit.CircuitBreaker("test", threshold=3, base_delay=10, max_delay=40)
+
+
+def expire(breaker):
+    "Make the backoff of an open circuit elapse."
+    breaker.retry_at = time.monotonic() - 1
+
+
+def test_opens_after_threshold_failures():
+    breaker = make_breaker()
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = make_breaker()
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.closed
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    assert breaker.state == circuit.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.closed
+    assert breaker.allow()
+
+
+def test_failed_probe_doubles_the_backoff_up_to_the_limit():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    for delay in (20, 40, 40):
+        expire(breaker)
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == circuit.OPEN
+        wait = breaker.retry_at - time.monotonic()
+        # Il jitter sceglie tra metà e tutto il ritardo
+        assert delay / 2 - 1 <= wait <= delay
+
+
+def test_lost_probe_does_not_block_the_circuit():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker._probe_at = time.monotonic() - breaker.base_delay - 1
+    assert breaker.allow()
@@ -0,0 +1,55 @@
+"""USER_SRP_AUTH and REFRESH_TOKEN_AUTH against the local Cognito stand-in."""
+
+import pytest
+
+from fake_appsync import FakeAppSync, FakeCognito
+from synthetic import load_module
+
+cognito = load_module("cognito")
+
+USERNAME = "demo@example.com"
+PASSWORD = "demo"
+
+
+@pytest.fixture
+def run(serve):
+    "Return a runner of `scenario(client, fake)` against a fresh Cognito stand-in."
+
+    def runner(scenario):
+        fake = FakeCognito({USERNAME: PASSWORD})
+
+        async def main(session, make_url):
+            client = cognito.CognitoClient(session, endpoint=str(make_url("/cognito")))
+            return await scenario(client, fake)
+
+        return serve(FakeAppSync(cognito=fake).make_app(), main)
+
+    return runner
+
+
+def test_login_returns_live_tokens(run):
+    async def scenario(client, fake):
+        tokens = await client.async_login(USERNAME, PASSWORD)
+        assert fake.is_valid(tokens["access_token"])
+        assert tokens["refresh_token"]
+
+    run(scenario)
+
+
+def test_refresh_keeps_the_refresh_token(run):
+    async def scenario(client, fake):
+        tokens = await client.async_login(USERNAME, PASSWORD)
+        refreshed = await client.async_refresh(tokens["refresh_token"])
+        assert fake.is_valid(refreshed["access_token"])
+        assert refreshed["refresh_token"] == tokens["refresh_token"]
+
+    run(scenario)
+
+
+def test_wrong_password_is_rejected(run):
+    async def scenario(client, fake):
+        with pytest.raises(cognito.CognitoError) as error:
+            await client.async_login(USERNAME, "wrong")
+        assert error.value.kind == "NotAuthorizedException"
+
+    run(scenario)
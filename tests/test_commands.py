@@ -0,0 +1,193 @@
+"""Writes of the command queue against the local AppSync stand-in."""
+
+import asyncio
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+from fake_appsync import FakeAppSync, FakeCognito
+from synthetic import load_module
+
+api_module = load_module("api")
+circuit = load_module("circuit")
+commands = load_module("commands")
+
+ENV_ID = "env-000"
+TOKEN = "live"
+RADIATOR = "RAD00000"
+
+
+class FakeTokenManager:
+    def __init__(self, token):
+        self.token = token
+        self.logins = 0
+
+    async def async_get_access_token(self):
+        return self.token
+
+    async def async_invalidate(self):
+        self.logins += 1
+        self.token = TOKEN
+        return self.token
+
+
+class FakeCoordinator:
+    "The part of the coordinator used by the command queue."
+
+    def __init__(self, api, token_manager, payload):
+        self.api = api
+        self.metrics = api.metrics
+        self.token_manager = token_manager
+        self.breaker = circuit.CircuitBreaker(ENV_ID, metrics=api.metrics)
+        self.data = {
+            "environments": {ENV_ID: {"payload": payload, "scheduling": False}}
+        }
+        self.applied = []
+
+    def get_breaker(self, envID):
+        return self.breaker
+
+    def get_keys(self, envID, serial):
+        return None
+
+    def async_command_sent(self, envID, prefixes):
+        list(prefixes)
+
+    def async_apply_changes(self, envID, payload, changes, version):
+        self.applied.append((changes, version))
+        self.data["environments"][envID]["payload"] = {
+            **payload,
+            "version": version,
+            "state": {"desired": {**payload["state"]["desired"], **changes}},
+        }
+
+
+@pytest.fixture(autouse=True)
+def short_debounce(monkeypatch):
+    monkeypatch.setattr(commands, "COMMAND_DEBOUNCE", 0.05)
+
+
+@pytest.fixture
+def fake():
+    cognito = FakeCognito({})
+    cognito.static_tokens.add(TOKEN)
+    fake = FakeAppSync(cognito=cognito)
+    fake.add_environment(ENV_ID, "Casa", 2)
+    return fake
+
+
+@pytest.fixture
+def run_queue(serve, fake):
+    "Return a runner of `scenario(queue, coordinator)` against the stand-in."
+
+    def run(scenario, token=TOKEN):
+        async def main(session, make_url):
+            api = api_module.IrsapApiClient(session, str(make_url("/graphql")))
+            payload = copy.deepcopy(fake.environments[ENV_ID]["payload"])
+            coordinator = FakeCoordinator(api, FakeTokenManager(token), payload)
+            hass = SimpleNamespace(loop=asyncio.get_running_loop())
+            queue = commands.CommandQueue(hass, coordinator, ENV_ID)
+            return await scenario(queue, coordinator)
+
+        return serve(fake.make_app(), main)
+
+    return run
+
+
+def desired(fake):
+    return fake.environments[ENV_ID]["payload"]["state"]["desired"]
+
+
+def test_rejected_token_logs_in_once_and_retries(run_queue, fake):
+    async def scenario(queue, coordinator):
+        assert await queue.async_set_temperature(RADIATOR, 21.5)
+        assert coordinator.token_manager.logins == 1
+        assert coordinator.breaker.closed
+        assert coordinator.breaker.failures == 0
+
+    run_queue(scenario, token="revoked")
+    assert desired(fake)["P000_MSP"]["p"]["v"] == 215
+
+
+def test_failed_write_counts_one_breaker_failure(run_queue, fake):
+    fake.error_rate = 1.0
+
+    async def scenario(queue, coordinator):
+        assert not await queue.async_set_temperature(RADIATOR, 21.5)
+        # Un guasto del cloud non giustifica un nuovo login
+        assert coordinator.token_manager.logins == 0
+        assert coordinator.breaker.failures == 1
+        assert coordinator.breaker.closed
+        assert coordinator.metrics.counters["UpdateShadow_calls"] == 1
+
+    run_queue(scenario)
+
+
+def test_commands_in_the_debounce_window_share_one_write(run_queue, fake):
+    async def scenario(queue, coordinator):
+        results = await asyncio.gather(
+            queue.async_set_temperature(RADIATOR, 21.0),
+            queue.async_set_temperature(RADIATOR, 22.5),
+            queue.async_set_enable("RAD00001", 0),
+        )
+        assert results == [True, True, True]
+        assert coordinator.metrics.counters["UpdateShadow_calls"] == 1
+
+    run_queue(scenario)
+    # L'ultimo setpoint dello stesso radiatore sostituisce i precedenti
+    assert desired(fake)["P000_MSP"]["p"]["v"] == 225
+    assert desired(fake)["P001_ENB"] == 0
+
+
+def test_command_already_applied_is_not_sent(run_queue):
+    async def scenario(queue, coordinator):
+        assert await queue.async_set_temperature(RADIATOR, 20.0)
+        assert await queue.async_set_enable(RADIATOR, 0)
+        assert coordinator.metrics.counters["UpdateShadow_calls"] == 0
+        assert coordinator.metrics.counters["GetShadow_calls"] == 0
+
+    run_queue(scenario)
+
+
+def test_shutdown_fails_the_waiting_commands(run_queue):
+    async def scenario(queue, coordinator):
+        command = asyncio.ensure_future(queue.async_set_temperature(RADIATOR, 21.5))
+        await asyncio.sleep(0)
+        queue.async_shutdown()
+        assert not await command
+        await asyncio.sleep(2 * commands.COMMAND_DEBOUNCE)
+        assert coordinator.metrics.counters["UpdateShadow_calls"] == 0
+
+    run_queue(scenario)
+
+
+def test_write_is_built_on_the_cached_snapshot(run_queue, fake):
+    async def scenario(queue, coordinator):
+        assert await queue.async_set_temperature(RADIATOR, 21.5)
+        assert coordinator.metrics.counters["GetShadow_calls"] == 0
+        # La versione della risposta aggiorna lo snapshot in cache
+        assert coordinator.applied[0][1] == 2
+
+    run_queue(scenario)
+    assert fake.environments[ENV_ID]["payload"]["version"] == 2
+
+
+def test_version_conflict_rereads_the_shadow_and_retries(run_queue, fake):
+    async def scenario(queue, coordinator):
+        # Un'altra app ha scritto dopo lo snapshot in cache
+        desired(fake)["P001_ENB"] = 0
+        fake.environments[ENV_ID]["payload"]["version"] = 5
+
+        assert await queue.async_set_temperature(RADIATOR, 21.5)
+        counters = coordinator.metrics.counters
+        assert counters["UpdateShadow_calls"] == 2
+        assert counters["GetShadow_calls"] == 1
+        assert counters["UpdateShadow_retries"] == 1
+        assert coordinator.breaker.failures == 0
+        assert coordinator.applied[0][1] == 6
+
+    run_queue(scenario)
+    # Solo le nostre modifiche: la scrittura dell'altra app resta
+    assert desired(fake)["P000_MSP"]["p"]["v"] == 215
+    assert desired(fake)["P001_ENB"] == 0
@@ -0,0 +1,69 @@
+"""Delta patches sent with UpdateShadow."""
+
+import copy
+
+from synthetic import load_module, make_desired, make_payload
+
+payload_module = load_module("payload")
+
+
+def test_setpoint_changes_only_the_setpoint_keys():
+    desired = make_desired(2)
+    before = copy.deepcopy(desired)
+    changes = payload_module.setpoint_changes(desired, "RAD00001", 21.5)
+
+    assert set(changes) == {
+        "P001_MSP",
+        "P001_TSP",
+        "P001_CSP",
+        "P001_MOD",
+        "E_CLL",
+        "E_CPC",
+    }
+    assert changes["P001_MSP"] == {"p": {"u": 0, "v": 215, "m": 3, "k": "MANUAL"}}
+    assert changes["P001_CSP"]["p"]["k"] == "COMFORT"
+    # Lo shadow in cache non viene modificato
+    assert desired == before
+
+
+def test_setpoint_mode_follows_the_scheduling():
+    desired = make_desired(1)
+    scheduled = payload_module.setpoint_changes(
+        desired, "RAD00000", 21, scheduling=True
+    )
+    manual = payload_module.setpoint_changes(desired, "RAD00000", 21, scheduling=False)
+    assert scheduled["P000_MOD"] == 2
+    assert scheduled["P000_TSP"]["e"] > "2000"
+    assert manual["P000_MOD"] == 1
+    assert manual["P000_TSP"]["e"] == "1970-01-01T00:00:00.000Z"
+
+
+def test_has_scheduling_needs_a_schedule_per_name():
+    desired = {"P000_NAM": "RAD00000", "P001_NAM": "RAD00001", "E_SCH": [{}, {}]}
+    assert payload_module.has_scheduling(desired)
+    desired["E_SCH"] = [{}]
+    assert not payload_module.has_scheduling(desired)
+
+
+def test_enable_changes():
+    desired = make_desired(1)
+    assert payload_module.enable_changes(desired, "RAD00000", 1) == {"P000_ENB": 1}
+    assert payload_module.enable_changes(desired, "RAD00000", 0, call=True) == {
+        "P000_ENB": 0,
+        "P000_CLL": 1,
+    }
+
+
+def test_unknown_radiator_changes_nothing():
+    desired = make_desired(1)
+    assert payload_module.setpoint_changes(desired, "MISSING", 21) == {}
+    assert payload_module.enable_changes(desired, "MISSING", 1) == {}
+
+
+def test_build_patch_carries_the_version_of_the_snapshot():
+    payload = make_payload(3)
+    patch = payload_module.build_patch(payload, {"P000_ENB": 1})
+    assert patch["id"] == payload["id"]
+    assert patch["version"] == payload["version"]
+    assert patch["clientId"] == payload_module.APP_CLIENT_ID
+    assert patch["state"] == {"desired": {"P000_ENB": 1}}
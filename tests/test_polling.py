@@ -0,0 +1,75 @@
+"""Adaptive poll interval policy."""
+
+from datetime import datetime, timedelta, timezone
+import time
+from types import SimpleNamespace
+
+from synthetic import load_module
+
+polling = load_module("polling")
+
+MIN, BASE, MAX = 15, 60, 900
+
+
+def snapshot(lups, temperature=20.0):
+    "Return radiators reporting at the given timestamps."
+    return {
+        f"P{i:03d}": SimpleNamespace(
+            last_update=datetime.fromtimestamp(lup, timezone.utc).isoformat(),
+            temperature=temperature,
+        )
+        for i, lup in enumerate(lups)
+    }
+
+
+def reporting(now, radiators=4, cadence=60):
+    "Return radiators that report every `cadence` seconds with spread phases."
+    return snapshot(now - cadence * i / radiators for i in range(radiators))
+
+
+def test_quiet_shadow_backs_off_to_the_maximum():
+    policy = polling.AdaptivePolling(MIN, BASE, MAX)
+    quiet = reporting(time.time() - 3600)
+    intervals = [policy.observe(quiet) for _ in range(8)]
+    assert intervals[0] == timedelta(seconds=BASE)
+    assert intervals[-1] == timedelta(seconds=MAX)
+    assert intervals == sorted(intervals)
+
+
+def test_polling_returns_to_base_when_updates_resume():
+    policy = polling.AdaptivePolling(MIN, BASE, MAX)
+    now = time.time()
+    # Otto ore di shadow fermo al massimo intervallo
+    quiet = reporting(now - 8 * 3600)
+    for _ in range(32):
+        assert policy.observe(quiet) <= timedelta(seconds=MAX)
+    assert policy.interval == timedelta(seconds=MAX)
+
+    # Il cloud riprende ad aggiornare ogni 60 s, letto ogni 900 s
+    for poll in range(5):
+        interval = policy.observe(reporting(now + poll * MAX))
+    assert interval == timedelta(seconds=BASE)
+    assert policy.cadence < 2 * BASE
+
+
+def test_cadence_decays_without_samples():
+    policy = polling.AdaptivePolling(MIN, BASE, MAX)
+    policy.cadence = MAX
+    for i in range(20):
+        # Un solo radiatore: nessuno scarto da cui imparare
+        policy.observe(snapshot([time.time() + i]))
+    assert policy.cadence < BASE + 1
+
+
+def test_command_polls_fast_until_confirmed():
+    policy = polling.AdaptivePolling(MIN, BASE, MAX)
+    before = time.time() - 5
+    for _ in range(5):
+        policy.observe(snapshot([before]))
+    assert policy.interval > timedelta(seconds=BASE)
+
+    policy.note_command(["P000"])
+    assert policy.interval == timedelta(seconds=MIN)
+    assert policy.observe(snapshot([before])) == timedelta(seconds=MIN)
+    # Il radiatore conferma con un _LUP successivo al comando
+    assert policy.observe(snapshot([time.time() + 1])) == timedelta(seconds=BASE)
@@ -0,0 +1,121 @@
+"""Priority, fairness and rate budget of the request scheduler."""
+
+import asyncio
+import time
+
+import pytest
+
+from synthetic import load_module
+
+scheduler_module = load_module("scheduler")
+RequestScheduler = scheduler_module.RequestScheduler
+PRIORITY_COMMAND = scheduler_module.PRIORITY_COMMAND
+PRIORITY_POLL = scheduler_module.PRIORITY_POLL
+
+
+async def request(scheduler, envID, priority, order):
+    async with scheduler.slot(envID, priority):
+        order.append((envID, priority))
+        await asyncio.sleep(0)
+
+
+async def serve(scheduler, requests):
+    "Queue `requests` behind a busy slot and return the order they were served."
+    order = []
+    blocker = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot("busy"):
+            await blocker.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(request(scheduler, envID, priority, order))
+        for envID, priority in requests
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.queued == len(requests)
+    blocker.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_commands_are_served_before_polls():
+    order = asyncio.run(
+        serve(
+            RequestScheduler(max_in_flight=1, rate=100),
+            [("a", PRIORITY_POLL), ("b", PRIORITY_POLL), ("c", PRIORITY_COMMAND)],
+        )
+    )
+    assert order[0] == ("c", PRIORITY_COMMAND)
+
+
+def test_homes_are_served_round_robin():
+    order = asyncio.run(
+        serve(
+            RequestScheduler(max_in_flight=1, rate=100),
+            [("a", PRIORITY_COMMAND)] * 3 + [("b", PRIORITY_COMMAND)],
+        )
+    )
+    assert [envID for envID, _ in order] == ["a", "b", "a", "a"]
+
+
+def test_rate_budget_spaces_requests_after_the_burst():
+    async def main():
+        scheduler = RequestScheduler(max_in_flight=100, rate=20)
+        order = []
+        start = time.monotonic()
+        await asyncio.gather(
+            *(request(scheduler, "a", PRIORITY_POLL, order) for _ in range(30))
+        )
+        return time.monotonic() - start
+
+    # 20 richieste subito, le altre 10 al ritmo di 20 al secondo
+    assert asyncio.run(main()) >= 0.45
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        scheduler = RequestScheduler(max_in_flight=1, rate=100)
+        order = []
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await blocker.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(request(scheduler, "b", PRIORITY_POLL, order))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        blocker.set()
+        await holder
+        await request(scheduler, "c", PRIORITY_POLL, order)
+        assert scheduler.in_flight == 0
+        return order
+
+    assert asyncio.run(main()) == [("c", PRIORITY_POLL)]
+
+
+def test_queue_timeout_gives_up_without_taking_a_slot():
+    async def main():
+        scheduler = RequestScheduler(max_in_flight=1, rate=100)
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await blocker.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(scheduler_module.QueueTimeout):
+            async with scheduler.slot("b", PRIORITY_POLL, timeout=0.05):
+                pass
+        blocker.set()
+        await holder
+        assert scheduler.in_flight == 0
+        assert scheduler.queued == 0
+
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""Shadow parser: key splitting, scaling and radiator records."""
+
+import dataclasses
+
+import pytest
+
+from synthetic import load_module, make_desired
+
+shadow = load_module("shadow")
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [
+        ("P000_TMP", ("P000", "_TMP")),
+        ("PCM_MSP", ("PCM", "_MSP")),
+        ("P000_X_ipAddress", ("P000", "_X_ipAddress")),
+        ("P000_X_OpenWindowSensorOffTime", ("P000", "_X_OpenWindowSensorOffTime")),
+        ("E_SCH", (None, None)),
+        ("P000_UNKNOWN", (None, None)),
+        ("NOUNDERSCORE", (None, None)),
+    ],
+)
+def test_split_key(key, expected):
+    assert shadow.split_key(key) == expected
+
+
+def test_parse_shadow_scales_the_values():
+    devices = shadow.parse_shadow(make_desired(2), envID="env-000")
+    assert set(devices) == {"P000", "P001"}
+    radiator = devices["P000"]
+    assert radiator.serial == "RAD00000"
+    assert radiator.envID == "env-000"
+    assert radiator.temperature == 19.5
+    assert radiator.target_temperature == 20.0
+    assert radiator.ip_address == "192.168.0.0"
+    assert radiator.state == "OFF"
+    assert devices["P001"].state == "HEAT"
+
+
+def test_parse_shadow_skips_environment_keys_and_prefixes_without_a_name():
+    desired = make_desired(1)
+    desired["P999_TMP"] = 180
+    devices = shadow.parse_shadow(desired)
+    assert list(devices) == ["P000"]
+
+
+def test_missing_or_invalid_values_are_none():
+    desired = make_desired(1)
+    del desired["P000_TMP"]
+    desired["P000_MSP"] = {"unexpected": True}
+    radiator = shadow.parse_shadow(desired)["P000"]
+    assert radiator.temperature is None
+    assert radiator.target_temperature is None
+
+
+def test_radiator_is_frozen_and_slotted():
+    radiator = shadow.parse_shadow(make_desired(1))["P000"]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        radiator.temperature = 30.0
+    assert not hasattr(radiator, "__dict__")
+
+
+def test_resolve_keys_trusts_cached_keys_only_while_the_name_matches():
+    desired = make_desired(2)
+    keys = shadow.build_key_map(shadow.parse_shadow(desired))
+    cached = keys["RAD00001"]
+    assert cached.msp == "P001_MSP"
+    assert shadow.resolve_keys(desired, "RAD00001", cached) is cached
+
+    # Il radiatore ha cambiato prefisso: le chiavi si ricalcolano
+    desired["P001_NAM"], desired["P000_NAM"] = "RAD00000", "RAD00001"
+    resolved = shadow.resolve_keys(desired, "RAD00001", cached)
+    assert resolved.prefix == "P000"
+    assert shadow.resolve_keys(desired, "MISSING") is None
@@ -0,0 +1,109 @@
+"""Shared shadow reads of the AppSync client against the local stand-in."""
+
+import asyncio
+
+import pytest
+
+from fake_appsync import FakeAppSync
+from synthetic import load_module
+
+api_module = load_module("api")
+
+ENV_ID = "env-000"
+TOKEN = "token"
+
+
+@pytest.fixture
+def run(serve):
+    "Return a runner of `scenario(api, fake)` against a fresh AppSync stand-in."
+
+    def runner(scenario):
+        fake = FakeAppSync(latency=0.05)
+        fake.add_environment(ENV_ID, "Casa", 2)
+
+        async def main(session, make_url):
+            api = api_module.IrsapApiClient(session, str(make_url("/graphql")))
+            return await scenario(api, fake)
+
+        return serve(fake.make_app(), main)
+
+    return runner
+
+
+def calls(api):
+    return api.metrics.counters["GetShadow_calls"]
+
+
+def test_concurrent_reads_share_one_call(run):
+    async def scenario(api, fake):
+        shadows = await asyncio.gather(
+            *(api.async_get_shadow(TOKEN, ENV_ID) for _ in range(5))
+        )
+        assert calls(api) == 1
+        assert all(shadow == shadows[0] for shadow in shadows)
+        assert shadows[0]["version"] == 1
+
+    run(scenario)
+
+
+def test_fresh_read_is_reused_until_it_expires(run):
+    async def scenario(api, fake):
+        await api.async_get_shadow(TOKEN, ENV_ID)
+        await api.async_get_shadow(TOKEN, ENV_ID)
+        assert calls(api) == 1
+
+        read_at, shadow = api._fresh[(ENV_ID, "GetShadow")]
+        api._fresh[(ENV_ID, "GetShadow")] = (
+            read_at - api_module.SHADOW_FRESHNESS - 1,
+            shadow,
+        )
+        await api.async_get_shadow(TOKEN, ENV_ID)
+        assert calls(api) == 2
+
+    run(scenario)
+
+
+def test_invalidate_forces_a_new_read(run):
+    async def scenario(api, fake):
+        await api.async_get_shadow(TOKEN, ENV_ID)
+        fake.environments[ENV_ID]["payload"]["version"] = 2
+        api.invalidate(ENV_ID)
+        shadow = await api.async_get_shadow(TOKEN, ENV_ID)
+        assert calls(api) == 2
+        assert shadow["version"] == 2
+
+    run(scenario)
+
+
+def test_read_invalidated_while_running_is_not_cached(run):
+    async def scenario(api, fake):
+        running = asyncio.create_task(api.async_get_shadow(TOKEN, ENV_ID))
+        await asyncio.sleep(0.01)
+        api.invalidate(ENV_ID)
+        await running
+        assert (ENV_ID, "GetShadow") not in api._fresh
+
+    run(scenario)
+
+
+def test_unshared_reads_always_call_the_cloud(run):
+    async def scenario(api, fake):
+        await asyncio.gather(
+            *(api.async_get_shadow(TOKEN, ENV_ID, shared=False) for _ in range(3))
+        )
+        assert calls(api) == 3
+
+    run(scenario)
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_read(run):
+    async def scenario(api, fake):
+        first = asyncio.create_task(api.async_get_shadow(TOKEN, ENV_ID))
+        second = asyncio.create_task(api.async_get_shadow(TOKEN, ENV_ID))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        shadow = await second
+        assert shadow["version"] == 1
+        assert calls(api) == 1
+
+    run(scenario)
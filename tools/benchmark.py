@@ -0,0 +1,139 @@
+"""Benchmarks for the shadow parser and the payload builders.
+
+Run it with ``python tools/benchmark.py --output results.json``. Passing the
+results of a previous release with ``--baseline old.json`` compares every case
+and exits with status 1 when one got slower than ``--threshold`` times its
+baseline.
+
+The modules are loaded without the package ``__init__``, so Home Assistant
+does not need to be installed.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+from synthetic import load_module, make_payload
+
+SIZES = (1, 10, 50, 100, 500)
+DEFAULT_THRESHOLD = 1.25  # Rapporto massimo rispetto alla baseline
+
+
+def cases(radiators):
+    "Return `name -> callable` for every benchmarked function."
+    shadow = load_module("shadow")
+    payload_module = load_module("payload")
+
+    payload = make_payload(radiators)
+    desired = payload["state"]["desired"]
+    # Il radiatore cercato è l'ultimo: caso peggiore della ricerca per nome
+    name = f"RAD{radiators - 1:05d}"
+    # Percorso dei comandi: chiavi e numero di _NAM già in cache
+    devices = shadow.parse_shadow(desired)
+    keys = shadow.build_key_map(devices)[name]
+    scheduling = payload_module.has_scheduling(desired)
+
+    return {
+        "extract_device_info": lambda: shadow.extract_device_info(desired),
+        "find_device_key_by_name": lambda: shadow.find_device_key_by_name(
+            desired, name
+        ),
+        "generate_device_payload": lambda: payload_module.generate_device_payload(
+            payload, name, temperature=21.5
+        ),
+        "generate_device_payload_for_hvac": lambda: payload_module.generate_device_payload_for_hvac(
+            payload, name, hvac_mode=1
+        ),
+        "setpoint_changes_cached": lambda: payload_module.setpoint_changes(
+            desired, name, 21.5, keys, scheduling
+        ),
+        "enable_changes_cached": lambda: payload_module.enable_changes(
+            desired, name, 1, keys=keys
+        ),
+    }
+
+
+def measure(func, repeat, min_time):
+    "Return the best time per call, in microseconds."
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number * 1e6
+
+
+def run(sizes, repeat, min_time):
+    results = {}
+    for radiators in sizes:
+        for name, func in cases(radiators).items():
+            results.setdefault(name, {})[str(radiators)] = round(
+                measure(func, repeat, min_time), 3
+            )
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "unit": "us/call",
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    "Return the cases slower than `threshold` times their baseline."
+    regressions = []
+    for name, timings in current["results"].items():
+        for size, value in timings.items():
+            previous = baseline.get("results", {}).get(name, {}).get(size)
+            if previous and value / previous > threshold:
+                regressions.append(
+                    {
+                        "case": name,
+                        "radiators": int(size),
+                        "baseline": previous,
+                        "current": value,
+                        "ratio": round(value / previous, 2),
+                    }
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda v: tuple(int(s) for s in v.split(",")),
+        default=SIZES,
+        help="comma separated radiator counts",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time", type=float, default=0.2, help="seconds per measurement"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat, args.min_time)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["threshold"] = args.threshold
+        report["regressions"] = compare(report, baseline, args.threshold)
+        status = 1 if report["regressions"] else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""Local stand-in for the IRSAP cloud: AppSync GraphQL, real-time and Cognito.
+
+Run it with ``python tools/fake_appsync.py --port 8765 --radiators 200`` and
+set the advanced endpoints of the config flow to:
+
+- API URL: ``http://127.0.0.1:8765/graphql``
+- Real-time URL: ``ws://127.0.0.1:8765/graphql``
+- Cognito URL: ``http://127.0.0.1:8765/cognito``
+
+The default account is ``demo@example.com`` / ``demo``. Shadow updates are
+pushed to every subscriber of an environment with::
+
+    curl -X POST localhost:8765/push/<envId> -d '{"version": 2, "state": {"desired": {"P000_TMP": 215}}}'
+
+``--latency``, ``--jitter`` and ``--error-rate`` slow down or fail the HTTP
+GraphQL requests to exercise the retry paths.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import random
+import secrets
+import time
+import uuid
+
+from aiohttp import WSMsgType, web
+
+from synthetic import make_payload
+
+_LOGGER = logging.getLogger(__name__)
+
+KEEPALIVE_MS = 300000
+TOKEN_LIFETIME = 3600  # Secondi, come Cognito
+POOL_ID = "eu-west-1_qU4ok6EGG"
+
+# Parametri SRP di Cognito (gruppo a 3072 bit della RFC 5054)
+N_HEX = (
+    "FFFFFFFFFFFFFFFFC90FDAA22168C234C4C6628B80DC1CD129024E088A67CC74020BBEA63B139B22514A08798E3404DD"
+    "EF9519B3CD3A431B302B0A6DF25F14374FE1356D6D51C245E485B576625E7EC6F44C42E9A637ED6B0BFF5CB6F406B7ED"
+    "EE386BFB5A899FA5AE9F24117C4B1FE649286651ECE45B3DC2007CB8A163BF0598DA48361C55D39A69163FA8FD24CF5F"
+    "83655D23DCA3AD961C62F356208552BB9ED529077096966D670C354E4ABC9804F1746C08CA18217C32905E462E36CE3B"
+    "E39E772C180E86039B2783A2EC07A28FB5C55DF06F4C52C9DE2BCBF6955817183995497CEA956AE515D2261898FA0510"
+    "15728E5A8AAAC42DAD33170D04507A33A85521ABDF1CBA64ECFB850458DBEF0A8AEA71575D060C7DB3970F85A6E1E4C7"
+    "ABF5AE8CDB0933D71E8C94E04A25619DCEE3D2261AD2EE6BF12FFA06D98A0864D87602733EC86A64521F2B18177B200C"
+    "BBE117577A615D6C770988C0BAD946E208E24FA074E5AB3143DB5BFCE0FD108E4B82D120A93AD2CAFFFFFFFFFFFFFFFF"
+)
+N = int(N_HEX, 16)
+G = 2
+
+
+def _hash_hex(data):
+    return hashlib.sha256(data).hexdigest().rjust(64, "0")
+
+
+def _pad_hex(value):
+    "Hex encode a number the way the Cognito SRP helpers hash it."
+    text = value if isinstance(value, str) else f"{value:x}"
+    if len(text) % 2 == 1:
+        return f"0{text}"
+    if text[0] in "89ABCDEFabcdef":
+        return f"00{text}"
+    return text
+
+
+K = int(_hash_hex(bytes.fromhex("00" + N_HEX + "02")), 16)
+
+
+def _hkdf(ikm, salt):
+    prk = hmac.new(salt, ikm, hashlib.sha256).digest()
+    return hmac.new(prk, b"Caldera Derived Key\x01", hashlib.sha256).digest()[:16]
+
+
+def _jwt(claims):
+    "Return an unsigned JWT: the integration only reads its `exp` claim."
+
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}."
+
+
+class FakeCognito:
+    """USER_SRP_AUTH and REFRESH_TOKEN_AUTH of the Cognito user pool API."""
+
+    def __init__(self, users, pool_id=POOL_ID, token_lifetime=TOKEN_LIFETIME):
+        self.users = users
+        self.pool_name = pool_id.split("_")[1]
+        self.token_lifetime = token_lifetime
+        # SECRET_BLOCK -> stato della sfida SRP in corso
+        self._challenges = {}
+        # token -> (username, scadenza)
+        self._access_tokens = {}
+        self._refresh_tokens = {}
+        self.static_tokens = set()
+
+    def is_valid(self, token):
+        "Return True if `token` is a live access token."
+        if token in self.static_tokens:
+            return True
+        issued = self._access_tokens.get(token)
+        return issued is not None and issued[1] > time.time()
+
+    async def handle(self, request):
+        target = request.headers.get("X-Amz-Target", "").rsplit(".", 1)[-1]
+        body = json.loads(await request.read() or b"{}")
+        try:
+            if target == "InitiateAuth":
+                result = self._initiate_auth(body)
+            elif target == "RespondToAuthChallenge":
+                result = self._respond_to_auth_challenge(body)
+            else:
+                raise CognitoError("InvalidParameterException", f"Unknown {target}")
+        except CognitoError as e:
+            return self._response({"__type": e.kind, "message": e.message}, 400)
+        return self._response(result)
+
+    @staticmethod
+    def _response(body, status=200):
+        return web.Response(
+            status=status,
+            text=json.dumps(body),
+            content_type="application/x-amz-json-1.1",
+        )
+
+    def _initiate_auth(self, body):
+        flow = body.get("AuthFlow")
+        params = body.get("AuthParameters") or {}
+        if flow == "REFRESH_TOKEN_AUTH":
+            username = self._refresh_tokens.get(params.get("REFRESH_TOKEN"))
+            if username is None:
+                raise CognitoError("NotAuthorizedException", "Invalid Refresh Token")
+            return {
+                "ChallengeParameters": {},
+                "AuthenticationResult": self._issue(username),
+            }
+        if flow != "USER_SRP_AUTH":
+            raise CognitoError("InvalidParameterException", f"Unsupported {flow}")
+
+        username = params.get("USERNAME")
+        if username not in self.users:
+            raise CognitoError(
+                "NotAuthorizedException", "Incorrect username or password."
+            )
+        big_a = int(params["SRP_A"], 16)
+        if big_a % N == 0:
+            raise CognitoError("InvalidParameterException", "Invalid SRP_A")
+
+        salt = secrets.token_hex(16)
+        x = self._private_key(username, salt)
+        verifier = pow(G, x, N)
+        small_b = secrets.randbelow(N)
+        big_b = (K * verifier + pow(G, small_b, N)) % N
+        secret_block = base64.b64encode(secrets.token_bytes(64)).decode()
+        self._challenges[secret_block] = (username, big_a, big_b, small_b, verifier)
+        return {
+            "ChallengeName": "PASSWORD_VERIFIER",
+            "ChallengeParameters": {
+                "USER_ID_FOR_SRP": username,
+                "SALT": salt,
+                "SRP_B": f"{big_b:x}",
+                "SECRET_BLOCK": secret_block,
+                "USERNAME": username,
+            },
+        }
+
+    def _respond_to_auth_challenge(self, body):
+        responses = body.get("ChallengeResponses") or {}
+        challenge = self._challenges.pop(
+            responses.get("PASSWORD_CLAIM_SECRET_BLOCK"), None
+        )
+        if challenge is None or body.get("ChallengeName") != "PASSWORD_VERIFIER":
+            raise CognitoError("NotAuthorizedException", "Invalid challenge")
+        username, big_a, big_b, small_b, verifier = challenge
+
+        u = int(_hash_hex(bytes.fromhex(_pad_hex(big_a) + _pad_hex(big_b))), 16)
+        s = pow(big_a * pow(verifier, u, N), small_b, N)
+        key = _hkdf(bytes.fromhex(_pad_hex(s)), bytes.fromhex(_pad_hex(f"{u:x}")))
+        message = (
+            self.pool_name.encode()
+            + username.encode()
+            + base64.b64decode(responses["PASSWORD_CLAIM_SECRET_BLOCK"])
+            + responses.get("TIMESTAMP", "").encode()
+        )
+        expected = base64.b64encode(hmac.new(key, message, hashlib.sha256).digest())
+        if not hmac.compare_digest(
+            expected, responses.get("PASSWORD_CLAIM_SIGNATURE", "").encode()
+        ):
+            raise CognitoError(
+                "NotAuthorizedException", "Incorrect username or password."
+            )
+
+        tokens = self._issue(username)
+        tokens["RefreshToken"] = refresh_token = secrets.token_urlsafe(48)
+        self._refresh_tokens[refresh_token] = username
+        return {"ChallengeParameters": {}, "AuthenticationResult": tokens}
+
+    def _private_key(self, username, salt):
+        # Lo stesso x che il client ricava dalla password
+        secret = _hash_hex(
+            f"{self.pool_name}{username}:{self.users[username]}".encode()
+        )
+        return int(_hash_hex(bytes.fromhex(_pad_hex(salt) + secret)), 16)
+
+    def _issue(self, username):
+        expires_at = int(time.time()) + self.token_lifetime
+        access_token = _jwt(
+            {
+                "sub": username,
+                "username": username,
+                "token_use": "access",
+                "exp": expires_at,
+                "jti": str(uuid.uuid4()),
+            }
+        )
+        self._access_tokens[access_token] = (username, expires_at)
+        return {
+            "AccessToken": access_token,
+            "IdToken": _jwt({"sub": username, "token_use": "id", "exp": expires_at}),
+            "ExpiresIn": self.token_lifetime,
+            "TokenType": "Bearer",
+        }
+
+
+class CognitoError(Exception):
+    """Error returned to the client with the Cognito `__type`."""
+
+    def __init__(self, kind, message):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+
+
+class FakeAppSync:
+    """ListEnvironments, GetShadow, asyncUpdateShadow and the real-time protocol."""
+
+    def __init__(
+        self,
+        keepalive_ms=KEEPALIVE_MS,
+        cognito=None,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+    ):
+        self.keepalive_ms = keepalive_ms
+        self.cognito = cognito
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # envId -> {"envName": ..., "payload": shadow}
+        self.environments = {}
+        # envId -> {(ws, subscription id)}
+        self.subscribers = {}
+
+    def add_environment(self, envID, name, radiators):
+        "Create an environment with a synthetic shadow."
+        payload = make_payload(radiators)
+        payload["id"] = str(uuid.uuid4())
+        payload["version"] = 1
+        self.environments[envID] = {"envName": name, "payload": payload}
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_post("/graphql", self.handle_graphql)
+        app.router.add_get("/graphql", self.handle_realtime)
+        app.router.add_post("/push/{envId}", self.handle_push)
+        if self.cognito is not None:
+            app.router.add_post("/cognito", self.cognito.handle)
+            app.router.add_post("/cognito/", self.cognito.handle)
+        return app
+
+    def _authorized(self, token):
+        return bool(token) and (self.cognito is None or self.cognito.is_valid(token))
+
+    async def handle_graphql(self, request):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.error_rate:
+            return web.Response(status=500, text="Injected error")
+
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not self._authorized(token):
+            return web.json_response(
+                {"errors": [{"errorType": "UnauthorizedException"}]}, status=401
+            )
+
+        body = await request.json()
+        operation = body.get("operationName")
+        variables = body.get("variables") or {}
+        if operation == "ListEnvironments":
+            data = {"listEnvironments": self._list_environments()}
+        elif operation == "GetShadow":
+            data = {"getShadow": self._get_shadow(variables["envId"])}
+        elif operation == "UpdateShadow":
+            data = {
+                "asyncUpdateShadow": await self._update_shadow(
+                    variables["envId"], json.loads(variables["payload"])
+                )
+            }
+        else:
+            return web.json_response(
+                {"errors": [{"message": f"Unknown operation {operation}"}]}
+            )
+        return web.json_response({"data": data})
+
+    def _list_environments(self):
+        return {
+            "environments": [
+                {
+                    "envId": envID,
+                    "envName": environment["envName"],
+                    "userRole": "OWNER",
+                    "__typename": "Environment",
+                }
+                for envID, environment in self.environments.items()
+            ],
+            "__typename": "EnvironmentList",
+        }
+
+    def _get_shadow(self, envID):
+        environment = self.environments.get(envID)
+        if environment is None:
+            return None
+        return {
+            "envId": envID,
+            "payload": json.dumps(environment["payload"]),
+            "__typename": "Shadow",
+        }
+
+    async def _update_shadow(self, envID, patch):
+        environment = self.environments.get(envID)
+        if environment is None:
+            return {"status": "ERROR", "code": 404, "message": "Not found"}
+
+        payload = environment["payload"]
+        if patch.get("version") is not None and patch["version"] != payload["version"]:
+            return {"status": "ERROR", "code": 409, "message": "Version conflict"}
+
+        changes = dict((patch.get("state") or {}).get("desired") or {})
+        # Il radiatore conferma il comando aggiornando il suo _LUP
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        for key in list(changes):
+            prefix = key.split("_", 1)[0]
+            if f"{prefix}_LUP" in payload["state"]["desired"]:
+                changes[f"{prefix}_LUP"] = now
+
+        payload["version"] += 1
+        payload["state"]["desired"].update(changes)
+        await self.publish(
+            envID, {"version": payload["version"], "state": {"desired": changes}}
+        )
+        return {
+            "status": "OK",
+            "code": 200,
+            "message": "",
+            "payload": json.dumps({"version": payload["version"]}),
+            "__typename": "UpdateShadowResult",
+        }
+
+    async def handle_realtime(self, request):
+        ws = web.WebSocketResponse(protocols=("graphql-ws",))
+        await ws.prepare(request)
+
+        try:
+            header = json.loads(base64.b64decode(request.query["header"]))
+        except (KeyError, ValueError):
+            await ws.send_json({"type": "connection_error"})
+            await ws.close()
+            return ws
+        if not self._authorized(header.get("Authorization")):
+            await ws.send_json({"type": "connection_error"})
+            await ws.close()
+            return ws
+
+        keepalive = asyncio.create_task(self._keepalive(ws))
+        subscriptions = []
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                message = json.loads(msg.data)
+                kind = message.get("type")
+                if kind == "connection_init":
+                    await ws.send_json(
+                        {
+                            "type": "connection_ack",
+                            "payload": {"connectionTimeoutMs": self.keepalive_ms},
+                        }
+                    )
+                elif kind == "start":
+                    data = json.loads(message["payload"]["data"])
+                    envID = data["variables"]["envId"]
+                    entry = (ws, message["id"])
+                    self.subscribers.setdefault(envID, set()).add(entry)
+                    subscriptions.append((envID, entry))
+                    await ws.send_json({"type": "start_ack", "id": message["id"]})
+                elif kind == "stop":
+                    for envID, entry in subscriptions:
+                        if entry[1] == message.get("id"):
+                            self.subscribers[envID].discard(entry)
+                    await ws.send_json({"type": "complete", "id": message.get("id")})
+        finally:
+            keepalive.cancel()
+            for envID, entry in subscriptions:
+                self.subscribers.get(envID, set()).discard(entry)
+
+        return ws
+
+    async def _keepalive(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self.keepalive_ms / 3000)
+            await ws.send_json({"type": "ka"})
+
+    async def publish(self, envID, document):
+        "Send a shadow document to every subscriber of an environment."
+        update = {"envId": envID, "payload": json.dumps(document)}
+        for ws, sub_id in list(self.subscribers.get(envID, ())):
+            if ws.closed:
+                continue
+            await ws.send_json(
+                {
+                    "type": "data",
+                    "id": sub_id,
+                    "payload": {"data": {"onUpdateShadow": update}},
+                }
+            )
+        return len(self.subscribers.get(envID, ()))
+
+    async def handle_push(self, request):
+        document = await request.json()
+        sent = await self.publish(request.match_info["envId"], document)
+        return web.json_response({"subscribers": sent})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--keepalive-ms", type=int, default=KEEPALIVE_MS)
+    parser.add_argument("--username", default="demo@example.com")
+    parser.add_argument("--password", default="demo")
+    parser.add_argument(
+        "--static-token",
+        action="append",
+        default=[],
+        help="access token always accepted, e.g. for load tests",
+    )
+    parser.add_argument("--token-lifetime", type=int, default=TOKEN_LIFETIME)
+    parser.add_argument("--environments", type=int, default=1)
+    parser.add_argument("--radiators", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per GraphQL request"
+    )
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of failed requests"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cognito = FakeCognito(
+        {args.username: args.password}, token_lifetime=args.token_lifetime
+    )
+    cognito.static_tokens.update(args.static_token)
+    server = FakeAppSync(
+        keepalive_ms=args.keepalive_ms,
+        cognito=cognito,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+    )
+    for i in range(args.environments):
+        envID = f"env-{i:03d}"
+        server.add_environment(envID, f"Casa {i + 1}", args.radiators)
+        _LOGGER.info(f"Environment {envID} with {args.radiators} radiators")
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
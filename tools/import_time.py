@@ -0,0 +1,110 @@
+"""Import cost of the integration modules, measured with ``-X importtime``.
+
+Run it from a Python environment with Home Assistant installed::
+
+    python tools/import_time.py --budget 50
+
+Each module is imported in a fresh interpreter after the Home Assistant
+modules that are already loaded at boot (``--preload``), so only the cost the
+integration adds is counted. The results are printed as JSON; with
+``--budget`` the script exits with status 1 when a module takes longer, in
+milliseconds.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PACKAGE = "custom_components.irsap_ha"
+
+MODULES = ("", "config_flow", "climate", "sensor")
+PRELOAD = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.update_coordinator",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.aiohttp_client",
+    "homeassistant.components.climate",
+    "homeassistant.components.sensor",
+    "homeassistant.components.persistent_notification",
+)
+
+
+def measure(module, preload, runs):
+    "Return the best cumulative import time of `module` and its heaviest imports."
+    code = "".join(f"import {name}\n" for name in preload)
+    code += "import sys\nprint('--- start', file=sys.stderr)\n"
+    code += f"import {module}\n"
+
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+        stderr = result.stderr.split("--- start", 1)[1]
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, cumulative_us, name = line[len("import time:") :].split("|")
+            try:
+                imports.append((name.strip(), int(self_us), int(cumulative_us)))
+            except ValueError:
+                continue  # Riga di intestazione
+
+        total = next(c for name, s, c in reversed(imports) if name == module)
+        if best is None or total < best[0]:
+            best = (total, imports)
+
+    total, imports = best
+    heaviest = sorted(imports, key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "ms": round(total / 1000, 2),
+        "modules": len(imports),
+        "heaviest": [
+            {"module": name, "self_ms": round(self_us / 1000, 2)}
+            for name, self_us, _ in heaviest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, help="maximum import time per module, in ms"
+    )
+    parser.add_argument(
+        "--preload",
+        type=lambda v: tuple(filter(None, v.split(","))),
+        default=PRELOAD,
+        help="comma separated modules imported before the measurement",
+    )
+    args = parser.parse_args()
+
+    report = {}
+    for name in MODULES:
+        module = f"{PACKAGE}.{name}" if name else PACKAGE
+        report[module] = measure(module, args.preload, args.runs)
+
+    status = 0
+    if args.budget is not None:
+        over = [module for module, r in report.items() if r["ms"] > args.budget]
+        report = {"budget_ms": args.budget, "over_budget": over, "modules": report}
+        status = 1 if over else 0
+
+    print(json.dumps(report, indent=2))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
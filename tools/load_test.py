@@ -0,0 +1,112 @@
+"""Load test of the AppSync client against tools/fake_appsync.py.
+
+Start the stand-in with a static token and a large home, then run the load::
+
+    python tools/fake_appsync.py --radiators 200 --static-token load --error-rate 0.01
+    python tools/load_test.py --token load --clients 20 --duration 30
+
+Every client loops over GetShadow and, with probability ``--write-ratio``, an
+asyncUpdateShadow of one setpoint built by the integration payload builders.
+The latency percentiles and error counts are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+from synthetic import load_module
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(int(len(values) * fraction), len(values) - 1)] * 1000, 2)
+
+
+async def client(api, payload_module, token, envID, deadline, write_ratio, stats):
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        # Ogni client misura una lettura vera, senza condividere quelle altrui
+        payload = await api.async_get_shadow(token, envID, shared=False)
+        stats["GetShadow"].append(time.monotonic() - start)
+        if payload is None:
+            stats["errors"] += 1
+            continue
+
+        if random.random() < write_ratio:
+            desired = payload["state"]["desired"]
+            names = [
+                v for k, v in desired.items() if k.endswith("_NAM") and k != "E_NAM"
+            ]
+            patch = payload_module.generate_device_payload(
+                payload, random.choice(names), temperature=random.randint(160, 240) / 10
+            )
+            start = time.monotonic()
+            result = await api.async_update_shadow(token, envID, patch)
+            stats["UpdateShadow"].append(time.monotonic() - start)
+            if not load_module("api").update_accepted(result):
+                stats["rejected"] += 1
+
+
+async def run(args):
+    api_module = load_module("api")
+    payload_module = load_module("payload")
+    stats = {"GetShadow": [], "UpdateShadow": [], "errors": 0, "rejected": 0}
+
+    async with aiohttp.ClientSession() as session:
+        api = api_module.IrsapApiClient(session, args.url)
+        envID = args.env or (await api.async_list_environments(args.token))[0]["envId"]
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *(
+                client(
+                    api,
+                    payload_module,
+                    args.token,
+                    envID,
+                    deadline,
+                    args.write_ratio,
+                    stats,
+                )
+                for _ in range(args.clients)
+            )
+        )
+
+    return {
+        "clients": args.clients,
+        "duration": args.duration,
+        "errors": stats["errors"],
+        "rejected_writes": stats["rejected"],
+        "operations": {
+            operation: {
+                "count": len(stats[operation]),
+                "per_second": round(len(stats[operation]) / args.duration, 1),
+                "p50_ms": percentile(stats[operation], 0.5),
+                "p95_ms": percentile(stats[operation], 0.95),
+                "p99_ms": percentile(stats[operation], 0.99),
+            }
+            for operation in ("GetShadow", "UpdateShadow")
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765/graphql")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--env", help="envId, the first environment by default")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
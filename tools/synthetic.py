@@ -0,0 +1,83 @@
+"""Synthetic IRSAP shadows shared by the development tools."""
+
+import importlib
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "custom_components", "irsap_ha"
+)
+
+
+def load_module(name):
+    "Import a module of the integration skipping the Home Assistant imports."
+    if "irsap_ha" not in sys.modules:
+        package = types.ModuleType("irsap_ha")
+        package.__path__ = [os.path.normpath(PACKAGE_DIR)]
+        sys.modules["irsap_ha"] = package
+    return importlib.import_module(f"irsap_ha.{name}")
+
+
+def make_desired(radiators):
+    "Build a synthetic `state.desired` document with the given number of radiators."
+    desired = {
+        "E_NAM": "Casa",
+        "E_CLL": 0,
+        "E_CPC": 0,
+        # Una pianificazione settimanale per radiatore, come nello shadow reale
+        "E_SCH": [
+            {
+                "d": [
+                    [{"s": 360 * h, "e": 360 * h + 180, "t": 200 + h} for h in range(4)]
+                    for _ in range(7)
+                ]
+            }
+            for _ in range(radiators)
+        ],
+    }
+    for i in range(radiators):
+        prefix = f"P{i:03d}"
+        desired.update(
+            {
+                f"{prefix}_NAM": f"RAD{i:05d}",
+                f"{prefix}_SRL": f"AA:BB:CC:{i // 256 % 256:02X}:{i % 256:02X}:01",
+                f"{prefix}_CNT": 1,
+                f"{prefix}_FWV": "1.9.3",
+                f"{prefix}_TYP": "NOW-R",
+                f"{prefix}_SLV": -60 - i % 20,
+                f"{prefix}_LUP": "2024-11-20T10:15:30.000Z",
+                f"{prefix}_TMP": 195 + i % 30,
+                f"{prefix}_MSP": {"p": {"u": 0, "v": 200, "m": 3, "k": "MANUAL"}},
+                f"{prefix}_TSP": {
+                    "p": {"u": 0, "v": 200, "m": 3, "k": "TEMPORARY"},
+                    "e": "1970-01-01T00:00:00.000Z",
+                },
+                f"{prefix}_CSP": {"p": {"u": 0, "v": 200, "m": 3, "k": "COMFORT"}},
+                f"{prefix}_MOD": 1,
+                f"{prefix}_CLL": 0,
+                f"{prefix}_ENB": i % 2,
+                f"{prefix}_X_ipAddress": f"192.168.{i // 256}.{i % 256}",
+                f"{prefix}_X_filPiloteEnabled": 0,
+                f"{prefix}_X_filPiloteStatus": 0,
+                f"{prefix}_X_standby": 0,
+                f"{prefix}_X_OpenWindowSensorEnabled": 1,
+                f"{prefix}_X_OpenWindowDetected": 0,
+                f"{prefix}_X_OpenWindowSensorOffTime": 30,
+                f"{prefix}_X_temperatureSensorOffset": 0,
+                f"{prefix}_X_hysteresis": 5,
+                f"{prefix}_X_vocValue": 120,
+                f"{prefix}_X_co2Value": 450,
+                f"{prefix}_X_lock": 0,
+            }
+        )
+    return desired
+
+
+def make_payload(radiators):
+    "Wrap a synthetic desired document in a GetShadow payload."
+    return {
+        "id": "bench",
+        "version": 42,
+        "state": {"desired": make_desired(radiators)},
+    }